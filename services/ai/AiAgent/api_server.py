@@ -6,14 +6,20 @@ Provides REST API endpoint for bill analysis
 
 import os
 import sys
-import json
+import hmac
 import base64
 import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import tempfile
+
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from starlette.datastructures import UploadFile
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 # Add the project root to Python path
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -35,19 +41,23 @@ from src.core.error_handler import ErrorHandler
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React Native app
+# Maximum accepted payload size
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max payload
 
-# Configure Flask to handle large payloads
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max payload
+# Token required by the admin endpoints (POST /cache/clear); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
-# Global AI agent instance
+# Global AI agent instance, created once and shared by every request so the
+# underlying HTTP connection pool is reused
 ai_agent = None
 
 def initialize_ai_agent():
     """Initialize the AI agent components"""
     global ai_agent
     
+    if ai_agent is not None:
+        return True
+    
     try:
         # Check for API key
         api_key = os.getenv("OPENROUTER_API_KEY")
@@ -67,7 +77,8 @@ def initialize_ai_agent():
             image_processor=image_processor,
             prompt_builder=prompt_builder,
             response_parser=response_parser,
-            error_handler=error_handler
+            error_handler=error_handler,
+            serialize="json"  # Responses only embed data_json, skip the dict
         )
         
         logger.info("AI Agent initialized successfully")
@@ -77,49 +88,119 @@ def initialize_ai_agent():
         logger.error(f"Failed to initialize AI Agent: {e}")
         return False
 
-@app.route('/health', methods=['GET'])
-def health_check():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the AI agent on startup and close its HTTP session on shutdown"""
+    if not initialize_ai_agent():
+        raise RuntimeError("Failed to initialize AI Agent")
+    yield
+    await ai_agent.close_client_session()
+    await OpenRouterClient.aclose_all()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(  # Enable CORS for React Native app
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+def json_response(payload, status_code=200):
+    """Serialize a response payload with orjson"""
+    return Response(orjson.dumps(payload), status_code=status_code, media_type="application/json")
+
+def error_response(message, status_code):
+    """Build the JSON error payload shared by every endpoint"""
+    return json_response({
+        'success': False,
+        'error': message
+    }, status_code)
+
+def receipt_data(result):
+    """Embed the orchestrator's pre-serialized receipt without re-encoding it"""
+    data_json = result.get('data_json')
+    if data_json is not None:
+        return orjson.Fragment(data_json)
+    return result.get('data', {})
+
+async def read_body(request, limit):
+    """Read the request body, or return None as soon as it exceeds limit bytes"""
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+def buffered_request(request, body):
+    """Rebuild the request around an already read body, for form() and json()"""
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    return Request(request.scope, receive)
+
+@app.get('/health')
+async def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'ai_agent_ready': ai_agent is not None,
         'api_key_configured': bool(os.getenv("OPENROUTER_API_KEY"))
     })
 
-@app.route('/analyze-bill', methods=['POST'])
-def analyze_bill():
+@app.post('/analyze-bill')
+async def analyze_bill(request: Request):
     """Analyze bill image and return structured data"""
     try:
         if not ai_agent:
-            return jsonify({
-                'success': False,
-                'error': 'AI Agent not initialized'
-            }), 500
+            return error_response('AI Agent not initialized', 500)
         
         # Log request info
-        content_length = request.content_length
+        try:
+            content_length = int(request.headers.get('content-length') or 0)
+        except ValueError:
+            return error_response('Invalid Content-Length header', 400)
         logger.info(f"Received analyze-bill request, content length: {content_length} bytes")
         
-        if content_length and content_length > 10 * 1024 * 1024:  # 10MB
+        if content_length > MAX_CONTENT_LENGTH:
+            return error_response('Payload too large', 413)
+        if content_length > 10 * 1024 * 1024:  # 10MB
             logger.warning(f"Large payload received: {content_length} bytes")
         
+        # The header can be missing or wrong (chunked uploads): enforce the
+        # limit on the bytes actually received
+        body = await read_body(request, MAX_CONTENT_LENGTH)
+        if body is None:
+            return error_response('Payload too large', 413)
+        request = buffered_request(request, body)
+        
         # Get image data from request
-        if 'image' in request.files:
+        image_bytes = None
+        image_path = None
+        payload = {}
+        image_file = None
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            form = await request.form()
+            image_file = form.get('image')
+        else:
+            try:
+                payload = await request.json()
+            except ValueError:
+                payload = {}
+            if not isinstance(payload, dict):
+                payload = {}
+        
+        if image_file is not None:
             # Handle file upload
-            image_file = request.files['image']
-            if not image_file:
-                return jsonify({
-                    'success': False,
-                    'error': 'No image file provided'
-                }), 400
+            if not isinstance(image_file, UploadFile):
+                return error_response('No image file provided', 400)
             
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                image_file.save(temp_file.name)
-                image_path = temp_file.name
-        elif 'imageData' in request.json:
+            # Keep the upload in memory
+            image_bytes = await image_file.read()
+        elif 'imageData' in payload:
             # Handle base64 encoded image (preferred for React Native)
-            image_data = request.json['imageData']
+            image_data = payload['imageData']
             logger.info(f"Received base64 data, length: {len(image_data)}")
             
             try:
@@ -129,133 +210,95 @@ def analyze_bill():
                     image_data = image_data.split(',')[1]
                     logger.info("Extracted base64 data from data URI")
                 
-                # Decode base64 to bytes
-                image_bytes = base64.b64decode(image_data)
+                # Decode base64 to bytes in a worker thread to keep the event loop free
+                loop = asyncio.get_running_loop()
+                image_bytes = await loop.run_in_executor(None, base64.b64decode, image_data)
                 logger.info(f"Decoded base64 to {len(image_bytes)} bytes")
-                
-                # Save to temporary file
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                    temp_file.write(image_bytes)
-                    image_path = temp_file.name
-                    logger.info(f"Saved base64 image to: {image_path}")
                     
             except Exception as e:
                 logger.error(f"Error processing base64 image: {e}")
-                return jsonify({
-                    'success': False,
-                    'error': f'Invalid image data: {str(e)}'
-                }), 400
-        elif 'imageUri' in request.json:
+                return error_response(f'Invalid image data: {str(e)}', 400)
+        elif 'imageUri' in payload:
             # Handle React Native file URI
-            image_uri = request.json['imageUri']
+            image_uri = payload['imageUri']
             if image_uri.startswith('file://'):
                 # Extract file path
                 image_path = image_uri.replace('file://', '')
                 # Check if file exists
                 if not os.path.exists(image_path):
-                    return jsonify({
-                        'success': False,
-                        'error': f'Image file not found: {image_path}'
-                    }), 400
+                    return error_response(f'Image file not found: {image_path}', 400)
             else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid image URI format'
-                }), 400
+                return error_response('Invalid image URI format', 400)
         else:
-            return jsonify({
-                'success': False,
-                'error': 'No image data provided. Expected: image (file), imageData (base64), or imageUri (file path)'
-            }), 400
-        
-        # Process with AI agent
-        logger.info(f"Processing image: {image_path}")
+            return error_response(
+                'No image data provided. Expected: image (file), imageData (base64), or imageUri (file path)',
+                400
+            )
         
-        # Run async function
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(ai_agent.extract(
+        # Process with AI agent (one-shot mode for faster processing)
+        if image_bytes is not None:
+            logger.info(f"Processing in-memory image: {len(image_bytes)} bytes")
+            result = await ai_agent.extract_from_bytes(
+                image_bytes,
+                "image/jpeg",
+                optimize_image=True,
+                two_step=False
+            )
+        else:
+            logger.info(f"Processing image: {image_path}")
+            result = await ai_agent.extract(
                 image_path=image_path,
                 optimize_image=True,
-                two_step=False  # Use one-shot mode for faster processing
-            ))
-        finally:
-            loop.close()
-            # Clean up temporary file
-            try:
-                os.unlink(image_path)
-            except:
-                pass
+                two_step=False
+            )
         
         # Check if processing was successful
         if not result.get('success', False):
-            return jsonify({
-                'success': False,
-                'error': result.get('error', 'Unknown processing error')
-            }), 500
+            return error_response(result.get('error', 'Unknown processing error'), 500)
         
         # Return successful result
-        return jsonify({
+        return json_response({
             'success': True,
-            'data': result.get('data', {}),
+            'data': receipt_data(result),
             'is_receipt': result.get('is_receipt', True),
             'processing_time': result.get('metrics', {}).get('generation_time_ms', 0) / 1000.0,
             'confidence': 0.95,  # Default confidence, could be calculated from AI response
             'usage': result.get('usage', {}),
+            'cached': result.get('cached', False),
             'raw_response': result.get('raw_response', '')
         })
         
     except Exception as e:
         logger.error(f"Error processing bill: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'Processing error: {str(e)}'
-        }), 500
+        return error_response(f'Processing error: {str(e)}', 500)
 
-@app.route('/test', methods=['GET'])
-def test_endpoint():
+@app.get('/test')
+async def test_endpoint():
     """Test endpoint with sample image"""
     try:
         if not ai_agent:
-            return jsonify({
-                'success': False,
-                'error': 'AI Agent not initialized'
-            }), 500
+            return error_response('AI Agent not initialized', 500)
         
         # Use a sample image from the dataset
         sample_image = PROJECT_ROOT / "Dataset" / "FR1.jpg"
         if not sample_image.exists():
-            return jsonify({
-                'success': False,
-                'error': 'Sample image not found'
-            }), 404
+            return error_response('Sample image not found', 404)
         
         logger.info(f"Testing with sample image: {sample_image}")
         
         # Process with AI agent
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            result = loop.run_until_complete(ai_agent.extract(
-                image_path=str(sample_image),
-                optimize_image=True,
-                two_step=False
-            ))
-        finally:
-            loop.close()
+        result = await ai_agent.extract(
+            image_path=str(sample_image),
+            optimize_image=True,
+            two_step=False
+        )
         
         if not result.get('success', False):
-            return jsonify({
-                'success': False,
-                'error': result.get('error', 'Test processing failed')
-            }), 500
+            return error_response(result.get('error', 'Test processing failed'), 500)
         
-        return jsonify({
+        return json_response({
             'success': True,
-            'data': result.get('data', {}),
+            'data': receipt_data(result),
             'is_receipt': result.get('is_receipt', True),
             'processing_time': result.get('metrics', {}).get('generation_time_ms', 0) / 1000.0,
             'message': 'Test successful'
@@ -263,31 +306,49 @@ def test_endpoint():
         
     except Exception as e:
         logger.error(f"Test error: {e}")
-        return jsonify({
-            'success': False,
-            'error': f'Test error: {str(e)}'
-        }), 500
+        return error_response(f'Test error: {str(e)}', 500)
 
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({
-        'success': False,
-        'error': 'Endpoint not found'
-    }), 404
+def is_admin(request):
+    """Check the request carries `Authorization: Bearer <ADMIN_TOKEN>`"""
+    if not ADMIN_TOKEN:
+        return False
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
 
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({
-        'success': False,
-        'error': 'Internal server error'
-    }), 500
+@app.post('/cache/clear')
+async def clear_cache(request: Request):
+    """Drop every cached extraction result (admin only)"""
+    if not ADMIN_TOKEN:
+        return error_response('Endpoint not found', 404)
+    if not is_admin(request):
+        return error_response('Unauthorized', 401)
+    if not ai_agent:
+        return error_response('AI Agent not initialized', 500)
+    
+    cleared = ai_agent.clear_cache()
+    logger.info(f"Cleared {cleared} cached results")
+    return json_response({
+        'success': True,
+        'cleared': cleared
+    })
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error(request: Request, exc: StarletteHTTPException):
+    if exc.status_code == 404:
+        return error_response('Endpoint not found', 404)
+    return error_response(str(exc.detail), exc.status_code)
+
+@app.exception_handler(Exception)
+async def internal_error(request: Request, exc: Exception):
+    return error_response('Internal server error', 500)
 
 def main():
     """Main function to start the server"""
     print("Starting AI Agent HTTP Server...")
     
-    # Initialize AI agent
-    if not initialize_ai_agent():
+    # The AI agent itself is created per worker in the lifespan handler;
+    # only check the configuration here so misconfiguration fails fast
+    if not os.getenv("OPENROUTER_API_KEY"):
         print("ERROR: Failed to initialize AI Agent. Please check your configuration.")
         print("Make sure you have:")
         print("1. OPENROUTER_API_KEY environment variable set")
@@ -298,14 +359,29 @@ def main():
     # Start server
     port = int(os.getenv('PORT', 5000))
     host = os.getenv('HOST', '0.0.0.0')
+    workers = int(os.getenv('WORKERS', 2))
     
-    print(f"AI Agent server starting on {host}:{port}")
+    print(f"AI Agent server starting on {host}:{port} with {workers} worker(s)")
     print("Available endpoints:")
     print(f"  GET  http://{host}:{port}/health - Health check")
     print(f"  POST http://{host}:{port}/analyze-bill - Analyze bill image")
     print(f"  GET  http://{host}:{port}/test - Test with sample image")
+    if ADMIN_TOKEN:
+        print(f"  POST http://{host}:{port}/cache/clear - Clear cached results (admin token)")
     
-    app.run(host=host, port=port, debug=True)
+    # "auto" selects uvloop and httptools when installed (uvicorn[standard]),
+    # falling back to asyncio/h11 on Windows
+    # Each worker process gets its own orchestrator and connection pool
+    uvicorn.run(
+        "api_server:app",
+        app_dir=str(PROJECT_ROOT),
+        host=host,
+        port=port,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        log_level="info"
+    )
 
 if __name__ == '__main__':
     main()
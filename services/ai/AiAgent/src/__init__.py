@@ -1,4 +1,13 @@
 """Module API pour communication avec OpenRouter/Groq."""
-from src.api.openrouter_client import OpenRouterClient
+from typing import TYPE_CHECKING
+
+from src._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from src.api.openrouter_client import OpenRouterClient
 
 __all__ = ["OpenRouterClient"]
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "OpenRouterClient": "src.api.openrouter_client",
+})
@@ -0,0 +1,29 @@
+"""
+Exports paresseux des paquets (PEP 562).
+"""
+import importlib
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def lazy_exports(package_name: str, exports: Dict[str, str]) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Construit les `__getattr__` et `__dir__` d'un paquet dont les noms publics
+    (nom -> module qui le définit) ne sont importés qu'au premier accès.
+    Importer un sous-module (ex. src.config) n'entraîne ainsi plus le
+    chargement d'openai, httpx ou Pillow par l'__init__ du paquet parent.
+    """
+    package_globals = importlib.import_module(package_name).__dict__
+
+    def __getattr__(name: str) -> Any:
+        module_path = exports.get(name)
+        if module_path is None:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module_path), name)
+        # Les accès suivants trouvent le nom directement, sans repasser ici
+        package_globals[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(package_globals) | set(exports))
+
+    return __getattr__, __dir__
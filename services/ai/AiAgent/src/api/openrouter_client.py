@@ -2,23 +2,91 @@
 Client pour interagir avec OpenRouter API (Groq provider pour Llama Scout).
 """
 import os
-import base64
+import binascii
+import functools
+import hashlib
 import time
 import asyncio
 import logging
 import httpx
+import orjson
 import re
-import json
 import random
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, Set, Tuple
 
-from openai import AsyncOpenAI, APIStatusError, APIError
+from openai import AsyncOpenAI, AsyncStream, APIStatusError, APIError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from src.config.app_config import settings
 from src.core.interfaces import APIClientInterface
+from src.utils.rate_limiter import TokenBucket, estimate_tokens
 
 # Configure le logger
 logger = logging.getLogger(__name__)
 
+# Clients HTTP partagés par (base_url, api_key) : un seul pool de connexions
+# par processus, quel que soit le nombre d'OpenRouterClient créés
+_SHARED_CLIENTS: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+
+
+# Cache des URL data: par empreinte d'image : une même image renvoyée
+# (retry, benchmark, doublon) n'est pas réencodée en base64
+_DATA_URL_CACHE_SIZE = 8
+_DATA_URL_CACHE: "OrderedDict[Tuple[bytes, str], str]" = OrderedDict()
+_DATA_URL_CACHE_LOCK = threading.Lock()
+
+
+def _encode_data_url(image_bytes: bytes, mime_type: str) -> str:
+    """
+    Construit l'URL data: base64 d'une image en une seule conversion ASCII.
+    Le cache est indexé par une empreinte blake2b de 16 octets plutôt que par
+    les octets eux-mêmes, pour ne pas garder les images en mémoire.
+    Appelée depuis un thread : seuls les accès au cache sont sous verrou.
+    """
+    key = (hashlib.blake2b(image_bytes, digest_size=16).digest(), mime_type)
+    with _DATA_URL_CACHE_LOCK:
+        data_url = _DATA_URL_CACHE.get(key)
+        if data_url is not None:
+            _DATA_URL_CACHE.move_to_end(key)
+            return data_url
+
+    header = b"data:" + mime_type.encode("ascii") + b";base64,"
+    data_url = (header + binascii.b2a_base64(image_bytes, newline=False)).decode("ascii")
+    with _DATA_URL_CACHE_LOCK:
+        _DATA_URL_CACHE[key] = data_url
+        if len(_DATA_URL_CACHE) > _DATA_URL_CACHE_SIZE:
+            _DATA_URL_CACHE.popitem(last=False)
+    return data_url
+
+
+@functools.lru_cache(maxsize=16)
+def _text_part(text: str, cache: bool = False) -> orjson.Fragment:
+    """
+    Bloc de contenu texte d'un message, pré-sérialisé en JSON.
+    Les prompts étant statiques, orjson insère ces octets tels quels dans le
+    corps de la requête au lieu de ré-échapper plusieurs Ko de texte à chaque appel.
+    """
+    part: Dict[str, Any] = {"type": "text", "text": text}
+    if cache:
+        part["cache_control"] = {"type": "ephemeral"}
+    return orjson.Fragment(orjson.dumps(part))
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    """
+    Entier lu dans une variable d'environnement ; `default` si elle est
+    absente, vide ou invalide (avec un avertissement dans ce dernier cas).
+    """
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("[OpenRouterClient] %s invalide (%r), valeur de la config utilisée : %s", name, value, default)
+        return default
+
 
 class OpenRouterClient(APIClientInterface):
     """Client pour communiquer avec Llama Scout via OpenRouter/Groq."""
@@ -37,10 +105,14 @@ class OpenRouterClient(APIClientInterface):
                 "Définis OPENROUTER_API_KEY dans l'environnement ou passe-la en paramètre."
             )
         else:
-            logger.debug(f"[OpenRouterClient] Clé API trouvée (longueur: {len(self.api_key)})")
+            logger.debug("[OpenRouterClient] Clé API trouvée (longueur: %d)", len(self.api_key))
 
-        # Utilise un client HTTP partagé pour bénéficier du pool de connexions
-        self.http_client = http_client or httpx.AsyncClient()
+        # Utilise un client HTTP partagé pour bénéficier du pool de connexions :
+        # une seule poignée de main TCP+TLS, réutilisée par tous les appels
+        self._shared_http_client = http_client is None
+        self.http_client = http_client or self._get_shared_http_client(
+            self.config.openrouter.base_url, self.api_key
+        )
         
         self.client = AsyncOpenAI(
             base_url=self.config.openrouter.base_url,
@@ -51,19 +123,80 @@ class OpenRouterClient(APIClientInterface):
         # Le modèle et le provider viennent de la config, avec fallback sur les variables d'env
         self.model = os.getenv("OPENROUTER_MODEL", self.config.model)
         self.provider = os.getenv("OPENROUTER_PROVIDER", self.config.provider)
+
+        # Paramètres constants d'un appel à l'autre, construits une seule fois
+        self._base_params = {
+            "model": self.model,
+            "temperature": self.config.temperature,
+            "response_format": {"type": self.config.openrouter.response_format_type},
+        }
+        if self.provider:
+            # Champ spécifique à OpenRouter, au même niveau que les paramètres standard
+            self._base_params["provider"] = {"order": (self.provider,)}
+
+        # Limiteur de débit proactif, actif seulement si une limite est configurée
+        rate_rpm = _env_int("OPENROUTER_RPM", self.config.requests_per_minute) or self.config.requests_per_minute
+        rate_tpm = _env_int("OPENROUTER_TPM", self.config.tokens_per_minute) or self.config.tokens_per_minute
+        self.limiter = TokenBucket(rate_rpm, rate_tpm) if rate_rpm or rate_tpm else None
+
+        # Délais d'exponential backoff, déterministes : calculés une seule fois
+        self._backoff_schedule = tuple(self.config.delay * (2 ** i) for i in range(self.config.max_retries))
+
+        # Tâches de récupération des statistiques en cours (mode background_stats)
+        self._pending_stats: Set[asyncio.Task] = set()
     
+    def _get_shared_http_client(self, base_url: str, api_key: str) -> httpx.AsyncClient:
+        """
+        Retourne le client HTTP partagé pour ce couple (base_url, api_key), créé au besoin.
+        Pas de verrou nécessaire : __init__ est synchrone, la boucle ne peut pas l'interrompre.
+        """
+        key = (base_url, api_key)
+        http_client = _SHARED_CLIENTS.get(key)
+        if http_client is None or http_client.is_closed:
+            # HTTP/2 : la complétion et la requête de stats sont multiplexées
+            # sur une même connexion vers OpenRouter
+            http_client = httpx.AsyncClient(
+                http2=self.config.http2,
+                follow_redirects=False,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_connections,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.config.timeout, connect=5.0),
+            )
+            _SHARED_CLIENTS[key] = http_client
+        return http_client
+
     async def close(self):
-        """Ferme la session du client HTTP."""
-        await self.http_client.aclose()
+        """
+        Ferme la session du client HTTP injecté. Le client partagé reste ouvert
+        pour les autres instances : il est fermé par `aclose_all`.
+        Les statistiques encore en cours de récupération sont attendues d'abord.
+        """
+        await self.flush_pending_stats()
+        if not self._shared_http_client:
+            await self.http_client.aclose()
 
+    @classmethod
+    async def aclose_all(cls):
+        """Ferme tous les clients HTTP partagés (à appeler à l'arrêt du processus)."""
+        while _SHARED_CLIENTS:
+            _, http_client = _SHARED_CLIENTS.popitem()
+            await http_client.aclose()
+
+
+    async def _sleep_backoff(self, attempt: int) -> None:
+        """Attend le délai d'exponential backoff de la tentative, plus 0 à 10% de jitter."""
+        delay = self._backoff_schedule[attempt]
+        await asyncio.sleep(delay + random.random() * delay * 0.1)
 
     async def get_generation_stats(self, generation_id: str) -> Optional[Dict[str, Any]]:
         """
         Récupère les statistiques détaillées d'une génération depuis OpenRouter.
         """
-        # Implémentation d'un exponential backoff avec jitter
-        base_delay = self.config.delay  # Délai de base en secondes
-        
+        last_attempt = self.config.max_retries - 1
+
         for attempt in range(self.config.max_retries):
             try:
                 headers = {
@@ -76,33 +209,115 @@ class OpenRouterClient(APIClientInterface):
                 )
 
                 if response.status_code == 200:
-                    json_data = response.json()
+                    if not response.content:
+                        return None
+                    json_data = orjson.loads(response.content)
                     return json_data.get("data", {})
-                elif response.status_code == 404 and attempt < self.config.max_retries - 1:
-                    # Calcul du délai avec exponential backoff et jitter
-                    delay = base_delay * (2 ** attempt)  # Exponential backoff
-                    jitter = random.uniform(0, delay * 0.1)  # Jitter de 0 à 10% du délai
-                    total_delay = delay + jitter
-                    await asyncio.sleep(total_delay)
+                elif response.status_code == 404 and attempt < last_attempt:
+                    await self._sleep_backoff(attempt)
                     continue
                 else:
                     return None
             except Exception:
-                if attempt < self.config.max_retries - 1:
-                    # Calcul du délai avec exponential backoff et jitter
-                    delay = base_delay * (2 ** attempt)  # Exponential backoff
-                    jitter = random.uniform(0, delay * 0.1)  # Jitter de 0 à 10% du délai
-                    total_delay = delay + jitter
-                    await asyncio.sleep(total_delay)
+                if attempt < last_attempt:
+                    await self._sleep_backoff(attempt)
                     continue
                 return None
         return None
 
-    def encode_image_bytes(self, image_bytes: bytes) -> str:
+    async def _record_stats(
+        self,
+        generation_id: str,
+        metrics: Dict[str, Any],
+        usage_data: Optional[Dict[str, int]],
+    ) -> None:
+        """
+        Récupère les statistiques de génération et complète `metrics` en place.
+        """
+        stats = await self.get_generation_stats(generation_id)
+        if not stats:
+            return
+
+        latency = stats.get("latency")
+        if latency is not None:
+            metrics["first_token_latency_ms"] = int(latency)
+
+        gen_time = stats.get("generation_time")
+        if gen_time is not None:
+            metrics["generation_time_ms"] = int(gen_time)
+
+        cost = stats.get("usage")
+        if cost is not None:
+            metrics["cost"] = float(cost)
+
+        if metrics["generation_time_ms"] and usage_data:
+            completion_tokens = usage_data.get("completion_tokens", 0)
+            if completion_tokens > 0 and metrics["generation_time_ms"] > 0:
+                metrics["throughput"] = float(completion_tokens) / (float(metrics["generation_time_ms"]) / 1000.0)
+
+    async def _collect_stats(
+        self,
+        generation_id: str,
+        metrics: Dict[str, Any],
+        usage_data: Optional[Dict[str, int]],
+    ) -> None:
+        """
+        Complète `metrics` avec les statistiques de génération, tout de suite
+        ou en tâche de fond selon `background_stats`.
+        """
+        if self.config.background_stats:
+            # Télémétrie hors chemin critique : les métriques sont complétées
+            # plus tard, dans le même dict que celui renvoyé
+            task = asyncio.create_task(self._record_stats(generation_id, metrics, usage_data))
+            self._pending_stats.add(task)
+            task.add_done_callback(self._pending_stats.discard)
+        else:
+            await self._record_stats(generation_id, metrics, usage_data)
+
+    async def flush_pending_stats(self) -> None:
+        """Attend la fin des récupérations de statistiques lancées en arrière-plan."""
+        if self._pending_stats:
+            await asyncio.gather(*self._pending_stats, return_exceptions=True)
+
+    def encode_image_bytes(self, image_bytes: bytes) -> bytes:
         """
-        Encode un objet bytes d'image en base64.
+        Encode un objet bytes d'image en base64 (bytes ASCII, sans copie str).
         """
-        return base64.b64encode(image_bytes).decode("utf-8")
+        return binascii.b2a_base64(image_bytes, newline=False)
+
+    def _build_params(
+        self,
+        image_url: str,
+        prompt: str,
+        max_tokens: int,
+        system_prompt: Optional[str],
+    ) -> Dict[str, Any]:
+        """
+        Construit les paramètres de la requête chat/completions.
+        """
+        user_content = [{"type": "image_url", "image_url": {"url": image_url}}]
+        if system_prompt:
+            # Préfixe statique en premier, image et consigne variable ensuite
+            if prompt:
+                user_content.append(_text_part(prompt))
+            messages = [
+                {
+                    "role": "system",
+                    "content": [
+                        _text_part(system_prompt, cache=True)
+                    ]
+                },
+                {"role": "user", "content": user_content},
+            ]
+        else:
+            user_content.insert(0, _text_part(prompt))
+            messages = [{"role": "user", "content": user_content}]
+
+        return {
+            **self._base_params,
+            "max_tokens": max_tokens,
+            "messages": messages,
+        }
 
     async def analyze_receipt(
         self,
@@ -110,65 +325,57 @@ class OpenRouterClient(APIClientInterface):
         mime_type: str,
         prompt: str,
         max_tokens: int,
+        system_prompt: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Analyse un ticket de caisse avec Llama Scout.
+        Un `system_prompt` est envoyé en message système marqué `cache_control`,
+        pour que les fournisseurs compatibles mettent ce préfixe statique en cache.
         """
-        logger.debug(f"[analyze_receipt] Début de l'analyse.")
-        logger.debug(f"[analyze_receipt] Modèle utilisé: {self.model}")
-        logger.debug(f"[analyze_receipt] Provider: {self.provider}")
+        logger.debug("[analyze_receipt] Début de l'analyse.")
+        logger.debug("[analyze_receipt] Modèle utilisé: %s", self.model)
+        logger.debug("[analyze_receipt] Provider: %s", self.provider)
 
-        # Encode l'image en base64
-        base64_image = self.encode_image_bytes(image_bytes)
-        logger.debug(f"[analyze_receipt] Image encodée en base64, taille: {len(base64_image)} chars")
-        logger.debug(f"[analyze_receipt] Type MIME fourni: {mime_type}")
+        # Encode l'image en URL data: base64, hors de la boucle d'événements :
+        # le hachage et l'encodage d'une image de plusieurs Mo bloqueraient
+        # les autres extractions en cours
+        image_url = await asyncio.to_thread(_encode_data_url, image_bytes, mime_type)
+        logger.debug("[analyze_receipt] Image encodée en base64, taille: %d chars", len(image_url))
+        logger.debug("[analyze_receipt] Type MIME fourni: %s", mime_type)
 
         try:
-            api_params = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "temperature": self.config.temperature,
-                "max_tokens": max_tokens,
-                "response_format": {"type": self.config.openrouter.response_format_type},
-            }
+            api_params = self._build_params(image_url, prompt, max_tokens, system_prompt)
 
-            if self.provider:
-                api_params["extra_body"] = {
-                    "provider": {
-                        "order": [self.provider]
-                    }
-                }
+            if self.limiter:
+                await self.limiter.acquire(estimate_tokens(prompt + (system_prompt or ""), max_tokens))
 
             logger.debug("[analyze_receipt] Appel API OpenRouter en cours...")
-            response = await self.client.chat.completions.create(**api_params)
-            logger.debug(f"[analyze_receipt] Réponse reçue, ID: {response.id if hasattr(response, 'id') else 'None'}")
+            # Corps sérialisé directement en bytes par orjson : évite la chaîne JSON
+            # intermédiaire du sérialiseur du SDK, qui recopie l'image base64.
+            # Le SDK garde la main sur les retries, les erreurs typées et le parsing.
+            response = await self.client.post(
+                "/chat/completions",
+                body=orjson.dumps(api_params),
+                cast_to=ChatCompletion,
+            )
+            # Chaque champ de la réponse SDK est lu une seule fois. getattr reste
+            # nécessaire pour l'ID : OpenRouter peut l'omettre sur certaines erreurs
+            generation_id = getattr(response, "id", None)
+            logger.debug("[analyze_receipt] Réponse reçue, ID: %s", generation_id)
 
-            generation_id = response.id if hasattr(response, 'id') else None
-            content_to_return = None
-            if response.choices and response.choices[0].message.content:
-                original_content = response.choices[0].message.content
-                logger.debug(f"[analyze_receipt] Contenu brut de la réponse (premiers 500 chars):\n{original_content[:500]}...")
-                content_to_return = original_content
+            choice = response.choices[0] if response.choices else None
+            content_to_return = (choice.message.content or None) if choice else None
+            if content_to_return and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[analyze_receipt] Contenu brut de la réponse (premiers 500 chars):\n%s...", content_to_return[:500])
 
+            # Les compteurs sont déjà typés int par le SDK
+            usage = response.usage
             usage_data = None
-            if response.usage:
+            if usage:
                 usage_data = {
-                    "prompt_tokens": int(response.usage.prompt_tokens),
-                    "completion_tokens": int(response.usage.completion_tokens),
-                    "total_tokens": int(response.usage.total_tokens),
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                    "total_tokens": usage.total_tokens,
                 }
 
             metrics: Dict[str, Any] = {
@@ -176,31 +383,11 @@ class OpenRouterClient(APIClientInterface):
                 "generation_time_ms": None,
                 "throughput": None,
                 "cost": None,
-                "finish_reason": None
+                "finish_reason": str(choice.finish_reason) if choice else None
             }
 
-            if response.choices:
-                metrics["finish_reason"] = str(response.choices[0].finish_reason)
-
             if generation_id:
-                stats = await self.get_generation_stats(generation_id)
-                if stats:
-                    latency = stats.get("latency")
-                    if latency is not None:
-                        metrics["first_token_latency_ms"] = int(latency)
-
-                    gen_time = stats.get("generation_time")
-                    if gen_time is not None:
-                        metrics["generation_time_ms"] = int(gen_time)
-
-                    cost = stats.get("usage")
-                    if cost is not None:
-                        metrics["cost"] = float(cost)
-
-                    if metrics["generation_time_ms"] and usage_data:
-                        completion_tokens = usage_data.get("completion_tokens", 0)
-                        if completion_tokens > 0 and metrics["generation_time_ms"] > 0:
-                            metrics["throughput"] = float(completion_tokens) / (float(metrics["generation_time_ms"]) / 1000.0)
+                await self._collect_stats(generation_id, metrics, usage_data)
 
             result = {
                 "success": True,
@@ -210,34 +397,107 @@ class OpenRouterClient(APIClientInterface):
                 "metrics": metrics
             }
 
-            logger.debug(f"[analyze_receipt] ✓ Analyse terminée avec succès")
-            logger.debug(f"[analyze_receipt] Métriques: {json.dumps(metrics, indent=2)}")
+            logger.debug("[analyze_receipt] ✓ Analyse terminée avec succès")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "[analyze_receipt] Métriques: %s",
+                    orjson.dumps(metrics, option=orjson.OPT_INDENT_2).decode("utf-8"),
+                )
 
             return result
 
         except APIStatusError as e:
-            logger.error(f"[analyze_receipt] ✗ Erreur HTTP {e.status_code} lors de l'analyse: {str(e)}")
-            if hasattr(e, 'response') and e.response:
-                logger.error(f"[analyze_receipt] Corps de la réponse d'erreur: {e.response.text}")
-            logger.exception("Détails de l'exception APIStatusError:")
+            # La trace complète n'est formatée qu'en mode debug
+            debug = logger.isEnabledFor(logging.DEBUG)
+            logger.error("[analyze_receipt] ✗ Erreur HTTP %s lors de l'analyse: %s", e.status_code, e, exc_info=debug)
+            if debug and e.response is not None:
+                logger.debug("[analyze_receipt] Corps de la réponse d'erreur: %s", e.response.text)
             return {
                 "success": False,
                 "error": f"HTTP {e.status_code}: {str(e)}",
                 "content": None
             }
         except APIError as e:
-            logger.error(f"[analyze_receipt] ✗ Erreur API OpenAI: {str(e)}")
-            logger.exception("Détails de l'exception APIError:")
+            logger.error("[analyze_receipt] ✗ Erreur API OpenAI: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {
                 "success": False,
                 "error": str(e),
                 "content": None
             }
         except Exception as e:
-            logger.error(f"[analyze_receipt] ✗ Erreur inattendue lors de l'analyse: {str(e)}")
-            logger.exception("Détails de l'exception générale:")
+            logger.error("[analyze_receipt] ✗ Erreur inattendue lors de l'analyse: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
             return {
                 "success": False,
                 "error": str(e),
                 "content": None
-            }
\ No newline at end of file
+            }
+
+    async def analyze_receipt_stream(
+        self,
+        image_bytes: bytes,
+        mime_type: str,
+        prompt: str,
+        max_tokens: int,
+        system_prompt: Optional[str] = None,
+        summary: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Variante en streaming (SSE) d'`analyze_receipt` : produit les fragments
+        de contenu au fil de leur arrivée. Fermer le générateur (`aclose`)
+        coupe la réponse en cours.
+        Si le flux est consommé jusqu'au bout, `summary` reçoit model, usage
+        (dernier événement SSE) et metrics. Les erreurs sont levées telles quelles.
+        """
+        image_url = await asyncio.to_thread(_encode_data_url, image_bytes, mime_type)
+        api_params = self._build_params(image_url, prompt, max_tokens, system_prompt)
+        api_params["stream"] = True
+        api_params["stream_options"] = {"include_usage": True}
+
+        if self.limiter:
+            await self.limiter.acquire(estimate_tokens(prompt + (system_prompt or ""), max_tokens))
+
+        logger.debug("[analyze_receipt_stream] Appel API OpenRouter en streaming...")
+        stream = await self.client.post(
+            "/chat/completions",
+            body=orjson.dumps(api_params),
+            cast_to=ChatCompletion,
+            stream=True,
+            stream_cls=AsyncStream[ChatCompletionChunk],
+        )
+
+        generation_id = None
+        model = None
+        finish_reason = None
+        usage_data = None
+        try:
+            async for chunk in stream:
+                generation_id = generation_id or chunk.id
+                model = model or chunk.model
+                if chunk.usage:
+                    usage_data = {
+                        "prompt_tokens": chunk.usage.prompt_tokens,
+                        "completion_tokens": chunk.usage.completion_tokens,
+                        "total_tokens": chunk.usage.total_tokens,
+                    }
+                if chunk.choices:
+                    choice = chunk.choices[0]
+                    if choice.finish_reason:
+                        finish_reason = str(choice.finish_reason)
+                    if choice.delta.content:
+                        yield choice.delta.content
+        finally:
+            await stream.close()
+
+        # Atteint seulement quand le flux a été lu en entier
+        logger.debug("[analyze_receipt_stream] Flux terminé, ID: %s", generation_id)
+        if summary is not None:
+            metrics: Dict[str, Any] = {
+                "first_token_latency_ms": None,
+                "generation_time_ms": None,
+                "throughput": None,
+                "cost": None,
+                "finish_reason": finish_reason
+            }
+            if generation_id:
+                await self._collect_stats(generation_id, metrics, usage_data)
+            summary.update(model=model, usage=usage_data, metrics=metrics)
@@ -6,7 +6,8 @@ Exemple d'utilisation :
     python src/async_main.py "Dataset/FR1.jpg" "Dataset/UK1.jpg" --two-step
 """
 import argparse
-import json
+import aiofiles
+import orjson
 import sys
 import logging
 import asyncio
@@ -26,19 +27,26 @@ from src.utils.image_processor import ImageProcessor
 from src.utils.prompt_builder import PromptBuilder
 from src.core.response_parser import ResponseParser
 from src.core.error_handler import ErrorHandler
+from src.utils import event_loop
 
 
-async def process_one_image(image_path: str, extractor: ExtractionOrchestrator, args: argparse.Namespace):
+async def process_one_image(
+    image_path: str,
+    extractor: ExtractionOrchestrator,
+    args: argparse.Namespace,
+    semaphore: asyncio.Semaphore
+):
     """Traite une seule image et affiche le résultat."""
     print(f"\n[ANALYSE] Début du traitement pour : {image_path}")
     print("-" * 40)
     
-    # Extraction
-    result = await extractor.extract(
-        image_path=image_path,
-        optimize_image=not args.no_optimize,
-        two_step=args.two_step
-    )
+    # Extraction (le sémaphore borne le nombre d'appels API simultanés)
+    async with semaphore:
+        result = await extractor.extract(
+            image_path=image_path,
+            optimize_image=not args.no_optimize,
+            two_step=args.two_step
+        )
 
     # Gestion des erreurs
     if not result["success"]:
@@ -82,8 +90,12 @@ async def process_one_image(image_path: str, extractor: ExtractionOrchestrator,
             print(f"    - Cost                : ${metrics_data['cost']:.6f}")
             
     data = result["data"]
-    json_indent = 2 if args.pretty else None
-    json_output = json.dumps(data, indent=json_indent, ensure_ascii=False)
+    if args.pretty:
+        json_bytes = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        # Réutilise la sérialisation déjà produite par l'orchestrateur
+        json_bytes = result.get("data_json") or orjson.dumps(data)
+    json_output = json_bytes.decode("utf-8")
 
     print("\n  [DONNEES EXTRAITES]")
     print("  " + "=" * 60)
@@ -94,13 +106,12 @@ async def process_one_image(image_path: str, extractor: ExtractionOrchestrator,
 
     # Sauvegarde si demandé (nom de fichier basé sur l'original)
     if args.output:
-        output_dir = Path(args.output)
-        output_dir.mkdir(exist_ok=True)
-        # Nom de fichier unique pour chaque image
-        output_path = output_dir / f"{Path(image_path).stem}_result.json"
+        # Nom de fichier unique pour chaque image (dossier créé dans main)
+        output_path = Path(args.output) / f"{Path(image_path).stem}_result.json"
         
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Écriture asynchrone : ne bloque pas les autres extractions en cours
+        async with aiofiles.open(output_path, "wb") as f:
+            await f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
         print(f"[SAUVEGARDE] Résultat sauvegardé dans : {output_path}")
 
 async def main():
@@ -141,6 +152,13 @@ async def main():
         help="Affiche le JSON formaté (avec indentations)"
     )
 
+    parser.add_argument(
+        "--concurrency", "-c",
+        type=int,
+        default=5,
+        help="Nombre maximum d'images analysées simultanément (défaut : 5)"
+    )
+
     parser.add_argument(
         "--debug",
         action="store_true",
@@ -149,14 +167,23 @@ async def main():
 
     args = parser.parse_args()
 
+    if args.concurrency < 1:
+        parser.error("--concurrency doit être supérieur ou égal à 1")
+
+    # Limite le nombre de requêtes en vol pour éviter les erreurs 429 d'OpenRouter
+    semaphore = asyncio.Semaphore(args.concurrency)
+
     # Configure le niveau de log
     log_level = logging.DEBUG if args.debug else logging.WARNING
     logging.basicConfig(level=log_level, format='[%(levelname)s] %(name)s: %(message)s')
 
-    # Étend les motifs glob pour obtenir la liste complète des fichiers
+    # Étend les motifs glob en parallèle dans des threads pour ne pas bloquer
+    # la boucle d'événements sur un système de fichiers lent (NFS, SMB)
+    expanded_lists = await asyncio.gather(
+        *(asyncio.to_thread(glob.glob, path) for path in args.image_paths)
+    )
     all_files = []
-    for path in args.image_paths:
-        expanded = glob.glob(path)
+    for path, expanded in zip(args.image_paths, expanded_lists):
         if not expanded:
             print(f"[AVERTISSEMENT] Aucun fichier trouvé pour le motif : {path}", file=sys.stderr)
         all_files.extend(expanded)
@@ -190,16 +217,21 @@ async def main():
         print("[INFO] Assure-toi d'avoir défini OPENROUTER_API_KEY dans ton environnement", file=sys.stderr)
         sys.exit(1)
 
+    # Crée le dossier de sortie une seule fois, avant le lancement des tâches
+    if args.output:
+        Path(args.output).mkdir(exist_ok=True)
+
     # Crée les tâches pour chaque image
-    tasks = [process_one_image(str(path), extractor, args) for path in all_files]
+    tasks = [process_one_image(str(path), extractor, args, semaphore) for path in all_files]
     
     # Exécute les tâches en parallèle
     await asyncio.gather(*tasks)
 
     # Nettoie la session client
     await extractor.close_client_session()
+    await OpenRouterClient.aclose_all()
     print("\n[FIN] Tous les traitements sont terminés.")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    event_loop.run(main())
\ No newline at end of file
@@ -2,23 +2,34 @@
 Module de configuration centralisé utilisant Pydantic pour la validation
 et un fichier JSON externe pour les valeurs.
 """
-import json
+import functools
 from pathlib import Path
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
+
+# Chemin du fichier de configuration, résolu une seule fois à l'import
+_CONFIG_PATH = (Path(__file__).parent.parent.parent / "config.json").resolve()
+
+# Configuration en lecture seule : chargée une fois, jamais modifiée ensuite
+_FROZEN = ConfigDict(frozen=True, extra="ignore")
 
 
 # --- Définition des modèles de configuration ---
 # Configuration spécifique à OpenRouter, définie avant son utilisation
 class OpenRouterConfig(BaseModel):
     """Configuration pour OpenRouter."""
+    model_config = _FROZEN
+
     base_url: str = Field(default="https://openrouter.ai/api/v1", description="Base URL de l'API OpenRouter.")
     generation_path: str = Field(default="/generation", description="Chemin pour récupérer les stats de génération.")
     response_format_type: str = Field(default="json_object", description="Format de réponse de l'API.")
 
 class APIConfig(BaseModel):
     """Configuration pour l'API OpenRouter."""
+    model_config = _FROZEN
+
     model: str = Field(default="meta-llama/llama-4-scout", description="Modèle à utiliser pour l'extraction.")
     provider: Optional[str] = Field(default=None, description="Fournisseur de service à forcer (ex: 'groq').")
     max_retries: int = Field(default=3, description="Nombre maximum de tentatives pour les appels API.")
@@ -27,11 +38,25 @@ class APIConfig(BaseModel):
     one_shot_max_tokens: int = Field(default=2000, description="Max tokens pour l'extraction en une étape.")
     validation_max_tokens: int = Field(default=100, description="Max tokens pour l'étape de validation seule.")
     extraction_max_tokens: int = Field(default=2000, description="Max tokens pour l'étape d'extraction seule.")
+    prompt_caching: bool = Field(default=False, description="Envoie les instructions en message système marqué cache_control (fournisseurs compatibles).")
+    speculative_two_step: bool = Field(default=False, description="En two-step, lance l'extraction en parallèle de la validation (plus rapide, mais consomme des tokens même pour un non-ticket).")
+    stream_responses: bool = Field(default=False, description="En one-shot, reçoit la réponse en streaming (SSE) et décode le JSON dès que l'objet se ferme.")
+    max_connections: int = Field(default=20, description="Taille du pool de connexions HTTP vers OpenRouter.")
+    keepalive_expiry: float = Field(default=90.0, description="Durée (s) de conservation des connexions inactives.")
+    http2: bool = Field(default=True, description="Active HTTP/2 vers OpenRouter (nécessite httpx[http2]).")
+    timeout: float = Field(default=120.0, description="Timeout global (s) des requêtes HTTP.")
+    requests_per_minute: Optional[int] = Field(default=None, description="Limite de requêtes par minute (None = illimité).")
+    tokens_per_minute: Optional[int] = Field(default=None, description="Limite de tokens par minute (None = illimité).")
+    background_stats: bool = Field(default=False, description="Récupère les stats de génération en tâche de fond (métriques complétées après le retour).")
+    response_cache_size: int = Field(default=256, description="Nombre de résultats mis en cache par empreinte d'image (0 = désactivé).")
+    response_cache_ttl: Optional[float] = Field(default=3600.0, description="Durée de vie (s) d'un résultat en cache (None = sans expiration).")
     # Nouvelle configuration spécifique à OpenRouter
     openrouter: OpenRouterConfig = Field(default_factory=lambda: OpenRouterConfig(), description="Paramètres OpenRouter.")
 
 class ImageConfig(BaseModel):
     """Configuration pour le traitement d'image."""
+    model_config = _FROZEN
+
     max_width: int = Field(default=2048, description="Largeur maximale de l'image.")
     max_height: int = Field(default=2048, description="Hauteur maximale de l'image.")
     max_file_size_mb: int = Field(default=4, description="Taille maximale du fichier en MB.")
@@ -40,20 +65,21 @@ class ImageConfig(BaseModel):
 
 class AppConfig(BaseModel):
     """Modèle de configuration principal."""
+    model_config = _FROZEN
+
     api: APIConfig = Field(default_factory=lambda: APIConfig())
     image: ImageConfig = Field(default_factory=lambda: ImageConfig())
 
 # --- Chargement de la configuration ---
 
+@functools.lru_cache(maxsize=1)
 def load_config() -> AppConfig:
     """
     Charge la configuration depuis config.json, avec des valeurs par défaut.
+    Mémoïsée : le fichier n'est lu et validé qu'une fois par processus.
     """
-    config_path = Path(__file__).resolve().parent.parent.parent / "config.json"
-    
-    if config_path.exists():
-        with open(config_path, "r", encoding="utf-8") as f:
-            config_data = json.load(f)
+    if _CONFIG_PATH.exists():
+        config_data = orjson.loads(_CONFIG_PATH.read_bytes())
         return AppConfig(**config_data)
     
     # Si le fichier n'existe pas, on retourne la configuration par défaut
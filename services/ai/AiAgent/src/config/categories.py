@@ -48,6 +48,14 @@ EXPENSE_CATEGORIES = {
 }
 
 
+# Valeurs dérivées d'une constante : calculées une seule fois à l'import
+_CATEGORIES_STR = "\n".join(
+    f"- **{category}**: {details['description']}"
+    for category, details in EXPENSE_CATEGORIES.items()
+)
+_CATEGORY_NAMES = tuple(EXPENSE_CATEGORIES)
+
+
 def get_categories_as_string() -> str:
     """
     Retourne une description formatée des catégories pour le prompt.
@@ -55,11 +63,7 @@ def get_categories_as_string() -> str:
     Returns:
         String formaté avec toutes les catégories et descriptions.
     """
-    categories_text = []
-    for category, details in EXPENSE_CATEGORIES.items():
-        categories_text.append(f"- **{category}**: {details['description']}")
-
-    return "\n".join(categories_text)
+    return _CATEGORIES_STR
 
 
 def get_category_names() -> list[str]:
@@ -69,4 +73,4 @@ def get_category_names() -> list[str]:
     Returns:
         Liste des noms de catégories.
     """
-    return list(EXPENSE_CATEGORIES.keys())
+    return list(_CATEGORY_NAMES)
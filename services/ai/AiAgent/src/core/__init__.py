@@ -1,10 +1,15 @@
 """Module core pour extraction et validation."""
-from src.core.extraction_orchestrator import ExtractionOrchestrator
-from src.core.json_formatter import (
-    ReceiptData,
-    InvalidReceipt,
-    parse_receipt_json
-)
+from typing import TYPE_CHECKING
+
+from src._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from src.core.extraction_orchestrator import ExtractionOrchestrator
+    from src.core.json_formatter import (
+        ReceiptData,
+        InvalidReceipt,
+        parse_receipt_json
+    )
 
 __all__ = [
     "ExtractionOrchestrator",
@@ -12,3 +17,10 @@ __all__ = [
     "InvalidReceipt",
     "parse_receipt_json"
 ]
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "ExtractionOrchestrator": "src.core.extraction_orchestrator",
+    "ReceiptData": "src.core.json_formatter",
+    "InvalidReceipt": "src.core.json_formatter",
+    "parse_receipt_json": "src.core.json_formatter",
+})
@@ -2,74 +2,42 @@
 Gestionnaire d'erreurs centralisé pour l'extraction de tickets de caisse.
 """
 import sys
-from typing import Any
+from functools import partialmethod
+from typing import Any, Optional
 from src.core.interfaces import ErrorHandlerInterface
 
+# Gabarit de réponse d'erreur, copié puis complété par chaque gestionnaire
+_TEMPLATE: dict[str, Any] = {"success": False, "error": None, "data": None}
 
-class ErrorHandler(ErrorHandlerInterface):
-    """Gestionnaire d'erreurs centralisé."""
+_IMG_PREFIX = "Erreur de traitement image : "
+_API_PREFIX = "Erreur API : "
+_PARSING_PREFIX = "Erreur de parsing : "
+_VALIDATION_PREFIX = "Erreur validation : "
+_API_VALIDATION_PREFIX = "Erreur API validation : "
+_API_EXTRACTION_PREFIX = "Erreur API extraction : "
 
-    def handle_image_processing_error(self, error: Exception) -> dict[str, Any]:
-        """
-        Gère les erreurs de traitement d'image.
-        """
-        return {
-            "success": False,
-            "error": f"Erreur de traitement image : {str(error)}",
-            "data": None
-        }
 
-    def handle_api_error(self, error: Exception) -> dict[str, Any]:
-        """
-        Gère les erreurs de l'API.
-        """
-        return {
-            "success": False,
-            "error": f"Erreur API : {str(error)}",
-            "data": None
-        }
+class ErrorHandler(ErrorHandlerInterface):
+    """
+    Gestionnaire d'erreurs centralisé.
+    Chaque gestionnaire public est `_make` spécialisé avec son préfixe de message.
+    """
 
-    def handle_parsing_error(self, error: Exception, raw_response: str) -> dict[str, Any]:
+    def _make(self, prefix: str, error: Exception, raw_response: Optional[str] = None) -> dict[str, Any]:
         """
-        Gère les erreurs de parsing.
+        Construit une réponse d'erreur à partir du gabarit.
         """
-        result = {
-            "success": False,
-            "error": f"Erreur de parsing : {str(error)}",
-            "data": None
-        }
-        
+        result = _TEMPLATE.copy()
+        result["error"] = prefix + str(error)
+
         if raw_response:
             result["raw_response"] = raw_response
-            
-        return result
 
-    def handle_validation_error(self, error: Exception) -> dict[str, Any]:
-        """
-        Gère les erreurs de validation.
-        """
-        return {
-            "success": False,
-            "error": f"Erreur validation : {str(error)}",
-            "data": None
-        }
-
-    def handle_api_validation_error(self, error: Exception) -> dict[str, Any]:
-        """
-        Gère les erreurs de l'API lors de la validation.
-        """
-        return {
-            "success": False,
-            "error": f"Erreur API validation : {str(error)}",
-            "data": None
-        }
+        return result
 
-    def handle_api_extraction_error(self, error: Exception) -> dict[str, Any]:
-        """
-        Gère les erreurs de l'API lors de l'extraction.
-        """
-        return {
-            "success": False,
-            "error": f"Erreur API extraction : {str(error)}",
-            "data": None
-        }
\ No newline at end of file
+    handle_image_processing_error = partialmethod(_make, _IMG_PREFIX)
+    handle_api_error = partialmethod(_make, _API_PREFIX)
+    handle_parsing_error = partialmethod(_make, _PARSING_PREFIX)
+    handle_validation_error = partialmethod(_make, _VALIDATION_PREFIX)
+    handle_api_validation_error = partialmethod(_make, _API_VALIDATION_PREFIX)
+    handle_api_extraction_error = partialmethod(_make, _API_EXTRACTION_PREFIX)
@@ -1,8 +1,13 @@
 """
 Orchestrateur principal pour l'extraction de tickets de caisse.
 """
-import json
-from typing import Dict, Any, Optional
+import asyncio
+import copy
+import hashlib
+import orjson
+from pydantic import BaseModel
+from pydantic_core import to_json
+from typing import Dict, Any, List, Literal, MutableMapping, Optional, Sequence
 from pathlib import Path
 
 from src.core.interfaces import (
@@ -14,6 +19,7 @@ from src.core.interfaces import (
 )
 from src.core.json_formatter import parse_receipt_json, ReceiptData, InvalidReceipt
 from src.config.app_config import settings
+from src.utils.response_cache import TTLCache
 
 
 class ExtractionOrchestrator:
@@ -25,10 +31,17 @@ class ExtractionOrchestrator:
         image_processor: ImageProcessorInterface,
         prompt_builder: PromptBuilderInterface,
         response_parser: ResponseParserInterface,
-        error_handler: ErrorHandlerInterface
+        error_handler: ErrorHandlerInterface,
+        cache: Optional[MutableMapping[str, Dict[str, Any]]] = None,
+        serialize: Literal["dict", "json"] = "dict"
     ):
         """
         Initialise l'orchestrateur avec les dépendances injectées.
+        `cache` permet de fournir un stockage partagé (ex. Redis) à la place
+        du cache mémoire par défaut.
+        Avec `serialize="json"`, les données extraites ne sont renvoyées que
+        sérialisées (`data_json`), directement depuis le modèle pydantic,
+        pour les appelants qui ne font que les réécrire.
         """
         self.client = api_client
         self.image_processor = image_processor
@@ -36,11 +49,53 @@ class ExtractionOrchestrator:
         self.response_parser = response_parser
         self.error_handler = error_handler
         self.config = settings.api
+        self.serialize = serialize
+
+        # Arguments de prompt de chaque appel : ils ne dépendent pas de l'image,
+        # donc construits une seule fois. Avec le cache de prompt, le prompt
+        # entier part en message système (préfixe mis en cache) et le message
+        # utilisateur ne contient que l'image
+        if self.config.prompt_caching:
+            self._one_shot_args = {"prompt": "", "system_prompt": prompt_builder.build_system_prompt(include_validation=True)}
+            self._extraction_args = {"prompt": "", "system_prompt": prompt_builder.build_system_prompt(include_validation=False)}
+            self._validation_args = {"prompt": "", "system_prompt": prompt_builder.build_validation_only_prompt()}
+        else:
+            self._one_shot_args = {"prompt": prompt_builder.build_extraction_prompt(include_validation=True)}
+            self._extraction_args = {"prompt": prompt_builder.build_extraction_prompt(include_validation=False)}
+            self._validation_args = {"prompt": prompt_builder.build_validation_only_prompt()}
+
+        # Empreinte du texte réellement envoyé (prompts du builder injecté,
+        # mode de cache de prompt, modèle) : un changement invalide le cache
+        self._prompt_key = hashlib.blake2b(
+            repr((
+                self.config.model,
+                self.config.prompt_caching,
+                self._one_shot_args,
+                self._extraction_args,
+                self._validation_args,
+            )).encode("utf-8"),
+            digest_size=8,
+        ).hexdigest()
+
+        # Cache des résultats, indexé par l'empreinte de l'image préparée.
+        # La taille configurée ne s'applique qu'au cache mémoire par défaut
+        # (0 le désactive) ; un cache injecté est toujours utilisé
+        self._cache: Optional[MutableMapping[str, Dict[str, Any]]] = cache
+        if cache is None and self.config.response_cache_size > 0:
+            self._cache = TTLCache(maxsize=self.config.response_cache_size, ttl=self.config.response_cache_ttl)
 
     async def close_client_session(self):
         """Ferme la session du client API."""
         await self.client.close()
 
+    def clear_cache(self) -> int:
+        """Vide le cache des résultats et retourne le nombre d'entrées supprimées."""
+        if self._cache is None:
+            return 0
+        count = len(self._cache)
+        self._cache.clear()
+        return count
+
     async def extract(
         self,
         image_path: str,
@@ -52,8 +107,8 @@ class ExtractionOrchestrator:
         """
         # 1. Prépare l'image en mémoire
         try:
-            # Note: Le traitement de l'image reste synchrone car il est CPU-bound.
-            # Pour de très gros volumes, on pourrait utiliser run_in_executor.
+            # Le traitement de l'image (CPU-bound) tourne dans le pool de threads
+            # de l'ImageProcessor, sans bloquer la boucle d'événements
             image_bytes, mime_type = await self.image_processor.process_image_in_memory(
                 image_path,
                 optimize=optimize_image
@@ -61,27 +116,110 @@ class ExtractionOrchestrator:
         except Exception as e:
             return self.error_handler.handle_image_processing_error(e)
 
+        return await self._extract_image_data((image_bytes, mime_type), two_step)
+
+    async def extract_batch(
+        self,
+        image_paths: Sequence[str],
+        concurrency: int = 8,
+        optimize_image: bool = True,
+        two_step: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Extrait plusieurs tickets en parallèle, au plus `concurrency` en vol.
+        Les préparations d'image et les appels API se recouvrent, sur le même
+        client (et donc le même pool de connexions).
+        Le débit reste borné par OpenRouter : le limiteur du client (RPM/TPM)
+        et les retries avec backoff du SDK sur les 429 s'appliquent à chaque appel.
+        Les résultats sont renvoyés dans l'ordre de `image_paths` ; une exception
+        inattendue devient une réponse d'erreur sans interrompre le lot.
+        Une annulation (CancelledError, qui n'hérite pas d'Exception) est relancée.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def extract_one(image_path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.extract(image_path, optimize_image=optimize_image, two_step=two_step)
+
+        results = await asyncio.gather(
+            *(extract_one(image_path) for image_path in image_paths),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        return [
+            self.error_handler.handle_api_error(result) if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+    async def extract_from_bytes(
+        self,
+        image_bytes: bytes,
+        mime_type: str = "image/jpeg",
+        optimize_image: bool = True,
+        two_step: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Extrait les données d'un ticket de caisse déjà chargé en mémoire,
+        sans écriture sur disque. Sans optimisation, les bytes sont envoyés
+        tels quels avec le type MIME fourni.
+        """
+        # 1. Prépare l'image en mémoire
+        if optimize_image:
+            try:
+                image_bytes, mime_type = await self.image_processor.process_image_bytes_in_memory(
+                    image_bytes,
+                    optimize=True
+                )
+            except Exception as e:
+                return self.error_handler.handle_image_processing_error(e)
+
+        return await self._extract_image_data((image_bytes, mime_type), two_step)
+
+    async def _extract_image_data(self, image_data: tuple[bytes, str], two_step: bool) -> Dict[str, Any]:
+        """
+        Lance l'extraction sur une image préparée.
+        """
+        # Une image identique déjà analysée (avec les mêmes prompts) est servie depuis le cache
+        cache_key = (
+            f"{hashlib.blake2b(image_data[0], digest_size=16).hexdigest()}"
+            f":{self._prompt_key}:{'two' if two_step else 'one'}"
+        )
+        cached = self._cache.get(cache_key) if self._cache is not None else None
+        if cached is not None:
+            # Copie profonde : l'appelant peut modifier `data` sans altérer l'entrée.
+            # Aucun appel n'a eu lieu, donc ni usage ni métriques à facturer
+            return {**copy.deepcopy(cached), "cached": True, "usage": {}, "metrics": {}}
+
         # 2. Choix du mode : one-shot ou two-step
-        image_data = (image_bytes, mime_type)
         if two_step:
-            return await self._extract_two_step(image_data)
+            result = await self._extract_two_step(image_data)
         else:
-            return await self._extract_one_shot(image_data)
+            result = await self._extract_one_shot(image_data)
+
+        if result.get("success") and self._cache is not None:
+            self._cache[cache_key] = copy.deepcopy(result)
+
+        return result
 
     async def _extract_one_shot(self, image_data: tuple[bytes, str]) -> Dict[str, Any]:
         """
         Extraction en un seul appel.
         """
         image_bytes, mime_type = image_data
-        prompt = self.prompt_builder.build_extraction_prompt(include_validation=True)
+        json_content = None
 
         try:
-            response = await self.client.analyze_receipt(
-                image_bytes=image_bytes,
-                mime_type=mime_type,
-                prompt=prompt,
-                max_tokens=self.config.one_shot_max_tokens
-            )
+            if self.config.stream_responses:
+                response, json_content = await self._stream_one_shot(image_data)
+            else:
+                response = await self.client.analyze_receipt(
+                    image_bytes=image_bytes,
+                    mime_type=mime_type,
+                    **self._one_shot_args,
+                    max_tokens=self.config.one_shot_max_tokens
+                )
         except Exception as e:
             return self.error_handler.handle_api_error(e)
 
@@ -89,12 +227,13 @@ class ExtractionOrchestrator:
             return self.error_handler.handle_api_error(Exception(response['error']))
 
         try:
-            json_content = self.response_parser.extract_json_from_response(response["content"])
+            if json_content is None:
+                json_content = self.response_parser.extract_json_from_response(response["content"])
             receipt_data = parse_receipt_json(json_content)
 
             return {
                 "success": True,
-                "data": receipt_data.model_dump(),
+                **self._serialize_data(receipt_data),
                 "is_receipt": isinstance(receipt_data, ReceiptData),
                 "usage": response.get("usage", {}),
                 "metrics": response.get("metrics", {}),
@@ -103,53 +242,84 @@ class ExtractionOrchestrator:
         except Exception as e:
             return self.error_handler.handle_parsing_error(e, response["content"])
 
-    async def _extract_two_step(self, image_data: tuple[bytes, str]) -> Dict[str, Any]:
+    def _serialize_data(self, receipt_data: BaseModel | Dict[str, Any]) -> Dict[str, Any]:
         """
-        Extraction en deux étapes : validation puis extraction.
+        Champs `data`/`data_json` du résultat selon le mode de sérialisation.
+        En mode "json", pydantic-core sérialise le modèle directement en bytes,
+        sans dict Python intermédiaire. Accepte aussi un dict déjà décodé
+        (réponse de validation).
+        """
+        if self.serialize == "json":
+            return {"data_json": to_json(receipt_data)}
+        data = receipt_data.model_dump() if isinstance(receipt_data, BaseModel) else receipt_data
+        return {"data": data, "data_json": orjson.dumps(data)}
+
+    async def _stream_one_shot(self, image_data: tuple[bytes, str]) -> tuple[Dict[str, Any], Optional[str]]:
+        """
+        Appel one-shot en streaming. Le JSON est décodé dès que l'objet se ferme
+        et la suite du flux (espaces, balise de fin) est abandonnée.
+        Renvoie (réponse, JSON extrait) ; le JSON vaut None si aucun objet
+        complet n'est apparu, le contenu passe alors par le parsing habituel.
         """
         image_bytes, mime_type = image_data
-        
-        # ÉTAPE 1 : Validation
-        validation_prompt = self.prompt_builder.build_validation_only_prompt()
+        summary: Dict[str, Any] = {}
+        scanner = self.response_parser.json_stream_scanner()
+        json_content = None
 
+        stream = self.client.analyze_receipt_stream(
+            image_bytes=image_bytes,
+            mime_type=mime_type,
+            **self._one_shot_args,
+            max_tokens=self.config.one_shot_max_tokens,
+            summary=summary
+        )
         try:
-            validation_response = await self.client.analyze_receipt(
-                image_bytes=image_bytes,
-                mime_type=mime_type,
-                prompt=validation_prompt,
-                max_tokens=self.config.validation_max_tokens
-            )
-        except Exception as e:
-            return self.error_handler.handle_api_validation_error(e)
+            async for chunk in stream:
+                # Chaque morceau n'est parcouru qu'une fois par le scanner
+                json_content = scanner.feed(chunk)
+                if json_content is not None:
+                    break
+        finally:
+            await stream.aclose()
 
-        if not validation_response["success"]:
-            return self.error_handler.handle_api_validation_error(Exception(validation_response['error']))
+        # usage et metrics ne sont connus que si le flux est allé jusqu'au bout
+        return {
+            "success": True,
+            "content": scanner.text,
+            "usage": summary.get("usage") or {},
+            "metrics": summary.get("metrics", {})
+        }, json_content
 
+    async def _extract_two_step(self, image_data: tuple[bytes, str]) -> Dict[str, Any]:
+        """
+        Extraction en deux étapes : validation puis extraction.
+        En mode spéculatif, l'extraction part en même temps que la validation
+        et est annulée si l'image n'est pas un ticket.
+        """
+
+        extraction_task = None
+        if self.config.speculative_two_step:
+            extraction_task = asyncio.create_task(self._request_extraction(image_data))
+
+        # ÉTAPE 1 : Validation
         try:
-            validation_json = self.response_parser.extract_json_from_response(validation_response["content"])
-            validation_data = json.loads(validation_json)
+            early_result, validation_response = await self._validate(image_data)
+        except BaseException:
+            if extraction_task:
+                extraction_task.cancel()
+            raise
 
-            if not validation_data.get("is_receipt", False):
-                return {
-                    "success": True,
-                    "is_receipt": False,
-                    "data": validation_data,
-                    "usage": validation_response.get("usage", {}),
-                    "metrics": validation_response.get("metrics", {})
-                }
-        except Exception as e:
-            return self.error_handler.handle_validation_error(e)
+        if early_result is not None:
+            if extraction_task:
+                extraction_task.cancel()
+            return early_result
 
         # ÉTAPE 2 : Extraction complète
-        extraction_prompt = self.prompt_builder.build_extraction_prompt(include_validation=False)
-
         try:
-            extraction_response = await self.client.analyze_receipt(
-                image_bytes=image_bytes,
-                mime_type=mime_type,
-                prompt=extraction_prompt,
-                max_tokens=self.config.extraction_max_tokens
-            )
+            if extraction_task:
+                extraction_response = await extraction_task
+            else:
+                extraction_response = await self._request_extraction(image_data)
         except Exception as e:
             return self.error_handler.handle_api_extraction_error(e)
 
@@ -175,11 +345,60 @@ class ExtractionOrchestrator:
 
             return {
                 "success": True,
-                "data": receipt_data.model_dump(),
+                **self._serialize_data(receipt_data),
                 "is_receipt": True,
                 "usage": total_usage,
                 "metrics": combined_metrics,
                 "raw_response": extraction_response["content"]
             }
         except Exception as e:
-            return self.error_handler.handle_parsing_error(e, extraction_response["content"])
\ No newline at end of file
+            return self.error_handler.handle_parsing_error(e, extraction_response["content"])
+
+    async def _validate(self, image_data: tuple[bytes, str]) -> tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Étape de validation du mode two-step.
+        Renvoie (résultat final, réponse) : le résultat final est non nul quand
+        l'extraction ne doit pas avoir lieu (erreur ou image qui n'est pas un ticket).
+        """
+        image_bytes, mime_type = image_data
+
+        try:
+            validation_response = await self.client.analyze_receipt(
+                image_bytes=image_bytes,
+                mime_type=mime_type,
+                **self._validation_args,
+                max_tokens=self.config.validation_max_tokens
+            )
+        except Exception as e:
+            return self.error_handler.handle_api_validation_error(e), None
+
+        if not validation_response["success"]:
+            return self.error_handler.handle_api_validation_error(Exception(validation_response['error'])), None
+
+        try:
+            validation_data = self.response_parser.extract_json_obj(validation_response["content"])
+
+            if not validation_data.get("is_receipt", False):
+                return {
+                    "success": True,
+                    "is_receipt": False,
+                    **self._serialize_data(validation_data),
+                    "usage": validation_response.get("usage", {}),
+                    "metrics": validation_response.get("metrics", {})
+                }, validation_response
+        except Exception as e:
+            return self.error_handler.handle_validation_error(e), None
+
+        return None, validation_response
+
+    async def _request_extraction(self, image_data: tuple[bytes, str]) -> Dict[str, Any]:
+        """
+        Appel API de l'étape d'extraction du mode two-step.
+        """
+        image_bytes, mime_type = image_data
+        return await self.client.analyze_receipt(
+            image_bytes=image_bytes,
+            mime_type=mime_type,
+            **self._extraction_args,
+            max_tokens=self.config.extraction_max_tokens
+        )
@@ -1,7 +1,7 @@
 """
 Interfaces (protocoles) pour l'inversion des dépendances (DIP).
 """
-from typing import Protocol, Any, Tuple, runtime_checkable
+from typing import Protocol, Any, AsyncIterator, Optional, Tuple, runtime_checkable
 
 
 @runtime_checkable
@@ -14,10 +14,23 @@ class APIClientInterface(Protocol):
         mime_type: str,
         prompt: str,
         max_tokens: int,
+        system_prompt: Optional[str] = None,
     ) -> dict[str, Any]:
         """Analyse un ticket de caisse."""
         ...
 
+    def analyze_receipt_stream(
+        self,
+        image_bytes: bytes,
+        mime_type: str,
+        prompt: str,
+        max_tokens: int,
+        system_prompt: Optional[str] = None,
+        summary: Optional[dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """Analyse un ticket de caisse en streaming (fragments de contenu)."""
+        ...
+
     async def close(self) -> None:
         """Ferme la session du client."""
         ...
@@ -31,6 +44,10 @@ class ImageProcessorInterface(Protocol):
         """Prépare une image en mémoire."""
         ...
 
+    async def process_image_bytes_in_memory(self, image_bytes: bytes, optimize: bool = True) -> Tuple[bytes, str]:
+        """Prépare une image déjà chargée en mémoire."""
+        ...
+
 
 @runtime_checkable
 class PromptBuilderInterface(Protocol):
@@ -48,6 +65,10 @@ class PromptBuilderInterface(Protocol):
         """Construit le prompt de validation seule."""
         ...
 
+    def build_system_prompt(self, include_validation: bool = True) -> str:
+        """Construit le message système (mis en cache) : le prompt d'extraction complet."""
+        ...
+
 
 @runtime_checkable
 class JSONFormatterInterface(Protocol):
@@ -66,6 +87,28 @@ class ResponseParserInterface(Protocol):
         """Extrait une chaîne JSON valide d'un texte."""
         ...
 
+    def extract_json_obj(self, response_text: str) -> Any:
+        """Extrait et décode le JSON d'une réponse."""
+        ...
+
+    def json_stream_scanner(self) -> "JSONStreamScannerInterface":
+        """Crée un scanner du premier objet ou tableau JSON complet d'une réponse en flux."""
+        ...
+
+
+@runtime_checkable
+class JSONStreamScannerInterface(Protocol):
+    """Interface pour le scanner de JSON d'une réponse en flux."""
+
+    @property
+    def text(self) -> str:
+        """Texte reçu jusqu'ici."""
+        ...
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Ajoute un morceau et renvoie le premier objet ou tableau JSON complet, ou None."""
+        ...
+
 
 @runtime_checkable
 class ErrorHandlerInterface(Protocol):
@@ -1,11 +1,17 @@
 """
 Validation and formatting of extracted data with Pydantic for WeSplit integration.
 """
-from typing import Optional, List
+import math
+from typing import Annotated, Any, Optional, List, Union
 from datetime import date, time
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Discriminator, Field, Tag, TypeAdapter, ValidationError, field_validator
+from src.config.categories import EXPENSE_CATEGORIES
 from src.core.interfaces import JSONFormatterInterface
 
+# Valid categories, computed once for O(1) membership checks
+_VALID_CATEGORIES: frozenset[str] = frozenset(EXPENSE_CATEGORIES)
+_VALID_CATEGORIES_STR = ", ".join(EXPENSE_CATEGORIES)
+
 
 class MerchantInfo(BaseModel):
     """Merchant information."""
@@ -54,13 +60,12 @@ class Totals(BaseModel):
         """
         Calculate totals from items and verify consistency.
         """
-        self.total_calculated = sum(item.total_price for item in items if item.total_price is not None)
+        # fsum avoids floating-point drift, hence fewer false mismatches near the tolerance
+        self.total_calculated = math.fsum([item.total_price for item in items if item.total_price is not None])
 
-        if self.total is not None:
-            self.total_matches = abs(self.total - self.total_calculated) <= tolerance if self.total_calculated is not None else False
-        else:
+        if self.total is None:
             self.total = self.total_calculated
-            self.total_matches = True
+        self.total_matches = abs(self.total - self.total_calculated) <= tolerance
 
 
 class ReceiptData(BaseModel):
@@ -78,23 +83,8 @@ class ReceiptData(BaseModel):
     @classmethod
     def validate_category(cls, v: Optional[str]) -> Optional[str]:
         """Verify that the category is valid."""
-        if v is None:
-            return v
-
-        valid_categories = [
-            "Food & Drinks",
-            "Events & Entertainment",
-            "Travel & Transport",
-            "Housing & Utilities",
-            "Shopping & Essentials",
-            "On-Chain Life"
-        ]
-
-        if v not in valid_categories:
-            raise ValueError(
-                f"Invalid category: {v}. "
-                f"Valid categories: {', '.join(valid_categories)}"
-            )
+        if v is not None and v not in _VALID_CATEGORIES:
+            raise ValueError(f"Invalid category: {v}. Valid categories: {_VALID_CATEGORIES_STR}")
         return v
 
     def validate_totals(self, tolerance: float = 0.01) -> None:
@@ -118,21 +108,40 @@ class JSONFormatter(JSONFormatterInterface):
         return parse_receipt_json(json_str)
 
 
+def _receipt_tag(value: Any) -> str:
+    """Route the payload to ReceiptData only when is_receipt is exactly true."""
+    if isinstance(value, dict):
+        is_receipt = value.get("is_receipt")
+    else:
+        is_receipt = getattr(value, "is_receipt", None)
+    return "receipt" if is_receipt is True else "invalid"
+
+
+# Built once: pydantic-core parses and validates the JSON in a single pass,
+# without an intermediate json.loads dict
+_RECEIPT_ADAPTER: TypeAdapter[ReceiptData | InvalidReceipt] = TypeAdapter(
+    Annotated[
+        Union[
+            Annotated[ReceiptData, Tag("receipt")],
+            Annotated[InvalidReceipt, Tag("invalid")],
+        ],
+        Discriminator(_receipt_tag),
+    ]
+)
+
+
 def parse_receipt_json(json_str: str) -> ReceiptData | InvalidReceipt:
     """
     Parse and validate JSON returned by the API.
     """
-    import json
-
     try:
-        data = json.loads(json_str)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON: {e}")
-
-    if data.get("is_receipt") is not True:
-        return InvalidReceipt(**data)
+        receipt = _RECEIPT_ADAPTER.validate_json(json_str)
+    except ValidationError as e:
+        if any(error["type"] == "json_invalid" for error in e.errors()):
+            raise ValueError(f"Invalid JSON: {e}")
+        raise
 
-    receipt = ReceiptData(**data)
-    receipt.validate_totals()
+    if isinstance(receipt, ReceiptData) and receipt.items:
+        receipt.validate_totals()
 
-    return receipt
\ No newline at end of file
+    return receipt
@@ -3,10 +3,70 @@ Parseur de réponse pour extraire le JSON des réponses de l'API.
 """
 import json
 import re
-from typing import Any
+import orjson
+from typing import Any, Optional
 
 from src.core.interfaces import ResponseParserInterface
 
+# Motif et décodeur compilés une seule fois, partagés par tous les appels.
+# Les décodages complets passent par orjson ; le décodeur de la stdlib ne sert
+# qu'à raw_decode, qu'orjson n'offre pas. orjson.JSONDecodeError hérite de
+# json.JSONDecodeError : une seule clause d'exception couvre les deux
+_FENCED_JSON_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+_DECODER = json.JSONDecoder()
+
+# Caractères significatifs pour la machine à états, et fin d'une chaîne JSON
+# (échappements compris) : les sauts entre ces positions se font en C
+_SPECIAL_RE = re.compile(r'[{}\[\]"\\]')
+_STRING_END_RE = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+
+def _find_json_bounds(text: str) -> tuple[int, int]:
+    """
+    Trouve les bornes du premier objet/tableau JSON équilibré, en ignorant
+    le contenu des chaînes. Renvoie (-1, -1) si aucun n'est complet.
+    """
+    start_pos = -1
+    depth = 0
+    open_char = close_char = None
+    pos = 0
+
+    while True:
+        match = _SPECIAL_RE.search(text, pos)
+        if match is None:
+            return -1, -1
+        i = match.start()
+        char = text[i]
+
+        # Un caractère échappé est ignoré
+        if char == '\\':
+            pos = i + 2
+            continue
+
+        # Saute directement à la fin de la chaîne
+        if char == '"':
+            end = _STRING_END_RE.match(text, i + 1)
+            if end is None:
+                return -1, -1
+            pos = end.end()
+            continue
+
+        pos = i + 1
+        # Recherche du premier caractère d'ouverture
+        if start_pos == -1:
+            if char == '{' or char == '[':
+                start_pos = i
+                open_char = char
+                close_char = '}' if char == '{' else ']'
+                depth = 1
+        # Suivi de la profondeur pour trouver la fin
+        elif char == open_char:
+            depth += 1
+        elif char == close_char:
+            depth -= 1
+            if depth == 0:
+                return start_pos, i + 1
+
 
 class ResponseParser(ResponseParserInterface):
     """Parseur de réponse pour extraire le JSON des réponses de l'API."""
@@ -15,71 +75,147 @@ class ResponseParser(ResponseParserInterface):
         """
         Extrait une chaîne JSON valide d'un texte potentiellement mal formaté.
         """
-        # Essaye d'abord d'extraire un bloc JSON avec des balises
-        match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
+        return self._extract(response_text)[0]
+
+    def extract_json_obj(self, response_text: str) -> Any:
+        """
+        Extrait et décode le JSON d'une réponse, sans second décodage.
+        """
+        return self._extract(response_text)[1]
+
+    def json_stream_scanner(self) -> "JSONStreamScanner":
+        """
+        Crée un scanner qui repère le premier objet ou tableau JSON complet
+        d'une réponse reçue morceau par morceau.
+        """
+        return JSONStreamScanner()
+
+    def _extract(self, response_text: str) -> tuple[str, Any]:
+        """
+        Renvoie le texte JSON extrait et l'objet décodé correspondant.
+        """
+        # Cas courant (response_format json_object) : la réponse est déjà du JSON brut
+        stripped = response_text.strip()
+        if stripped[:1] in ('{', '['):
+            try:
+                return stripped, orjson.loads(stripped)
+            except json.JSONDecodeError:
+                pass
+
+        # Essaye ensuite d'extraire un bloc JSON avec des balises, si il y en a
+        match = _FENCED_JSON_RE.search(response_text) if '```' in response_text else None
         if match:
             potential_json = match.group(1)
             try:
-                json.loads(potential_json)
-                return potential_json
+                return potential_json, orjson.loads(potential_json)
             except json.JSONDecodeError:
                 pass
 
-        # Si aucune balise JSON n'a été trouvée, utilise une machine à états
+        # Chemin rapide : le scanner C de raw_decode trouve la fin de la valeur
+        # JSON qui commence au premier '{' ou '[' en une seule passe
+        starts = [pos for pos in (response_text.find('{'), response_text.find('[')) if pos != -1]
+        if starts:
+            idx = min(starts)
+            try:
+                obj, end = _DECODER.raw_decode(response_text, idx)
+                return response_text[idx:end], obj
+            except json.JSONDecodeError:
+                pass
+
+        # Sinon, utilise une machine à états
         # pour trouver le début et la fin de l'objet/tableau JSON principal
-        start_pos = -1
-        end_pos = -1
-        depth = 0
-        in_string = False
-        escape_next = False
-        open_char = None
-        close_char = None
-        
-        for i, char in enumerate(response_text):
-            # Gestion des caractères d'échappement dans les chaînes
-            if escape_next:
-                escape_next = False
-                continue
-                
-            if char == '\\':
-                escape_next = True
-                continue
-                
-            # Gestion des chaînes de caractères
-            if char == '"' and not escape_next:
-                in_string = not in_string
-                
-            # Si on est dans une chaîne, ignore les caractères spéciaux
-            if in_string:
-                continue
-                
-            # Recherche du premier caractère d'ouverture
-            if start_pos == -1:
-                if char == '{':
-                    start_pos = i
-                    open_char = '{'
-                    close_char = '}'
-                    depth = 1
-                elif char == '[':
-                    start_pos = i
-                    open_char = '['
-                    close_char = ']'
-                    depth = 1
-            # Suivi de la profondeur pour trouver la fin
-            elif char == open_char:
-                depth += 1
-            elif char == close_char:
-                depth -= 1
-                if depth == 0:
-                    end_pos = i + 1
-                    break
-        
+        start_pos, end_pos = _find_json_bounds(response_text)
+
         if start_pos != -1 and end_pos != -1:
             potential_json = response_text[start_pos:end_pos]
             try:
-                json.loads(potential_json)
-                return potential_json
+                return potential_json, orjson.loads(potential_json)
             except json.JSONDecodeError:
                 pass
         
-        raise ValueError("Impossible d'extraire un objet ou un tableau JSON complet et valide.")
\ No newline at end of file
+        raise ValueError("Impossible d'extraire un objet ou un tableau JSON complet et valide.")
+
+
+class JSONStreamScanner:
+    """
+    Repère le premier objet ou tableau JSON complet d'un flux reçu par
+    morceaux, comme _find_json_bounds sur un texte complet.
+    L'état de la machine à états (profondeur, chaîne ouverte, échappement)
+    est conservé d'un morceau à l'autre : chaque caractère n'est examiné
+    qu'une fois, et raw_decode n'est lancé que lorsque les délimiteurs
+    s'équilibrent, depuis la position du délimiteur ouvrant.
+    """
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._offset = 0        # Longueur reçue avant le morceau courant
+        self._start = -1        # Position du délimiteur ouvrant dans le texte complet
+        self._open_char = self._close_char = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False    # Le premier caractère du morceau suivant est échappé
+
+    @property
+    def text(self) -> str:
+        """Texte reçu jusqu'ici."""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Ajoute un morceau et renvoie le premier objet ou tableau JSON
+        complet, ou None tant qu'aucun n'est terminé.
+        """
+        self._parts.append(chunk)
+        offset = self._offset
+        self._offset += len(chunk)
+
+        pos = 0
+        if self._escape and chunk:
+            self._escape = False
+            pos = 1
+
+        while True:
+            # Saute directement à la fin de la chaîne, si elle est dans ce morceau
+            if self._in_string:
+                end = _STRING_END_RE.match(chunk, pos)
+                if end is None:
+                    # Un nombre impair de barres obliques inverses finales échappe le caractère suivant
+                    tail = chunk[pos:]
+                    self._escape = (len(tail) - len(tail.rstrip('\\'))) % 2 == 1
+                    return None
+                self._in_string = False
+                pos = end.end()
+                continue
+
+            match = _SPECIAL_RE.search(chunk, pos)
+            if match is None:
+                return None
+            i = match.start()
+            char = chunk[i]
+            pos = i + 1
+
+            if char == '\\':
+                # Un caractère échappé est ignoré, même au morceau suivant
+                pos = i + 2
+                self._escape = pos > len(chunk)
+            elif char == '"':
+                self._in_string = True
+            elif self._depth == 0:
+                # Recherche du premier caractère d'ouverture
+                if char == '{' or char == '[':
+                    self._start = offset + i
+                    self._open_char = char
+                    self._close_char = '}' if char == '{' else ']'
+                    self._depth = 1
+            elif char == self._open_char:
+                self._depth += 1
+            elif char == self._close_char:
+                self._depth -= 1
+                if self._depth == 0:
+                    text = self.text
+                    try:
+                        _, end_pos = _DECODER.raw_decode(text, self._start)
+                    except json.JSONDecodeError:
+                        # Valeur invalide : on attend la suivante
+                        continue
+                    return text[self._start:end_pos]
@@ -7,45 +7,51 @@ Exemple d'utilisation :
     python src/main.py Dataset/ticket-de-caisse.jpg --output result.json
 """
 import argparse
-import json
+import orjson
 import sys
 import logging
-import asyncio
 from pathlib import Path
-from dotenv import load_dotenv
 
 # Ajoute le répertoire racine au PYTHONPATH pour les imports absolus
 # Cela permet d'exécuter `python src/main.py` directement
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-# Charge les variables d'environnement depuis .env (supporte le fichier déplacé)
+# Candidats pour le fichier .env (supporte le fichier déplacé)
 ENV_PATH_CANDIDATES = [
     PROJECT_ROOT / ".env",
     PROJECT_ROOT.parent / ".env",
 ]
 
-env_loaded = False
-for candidate in ENV_PATH_CANDIDATES:
-    if candidate.is_file():
-        env_loaded = load_dotenv(dotenv_path=candidate, override=False)
-        if env_loaded:
-            break
 
-if not env_loaded:
-    load_dotenv(override=False)
+def load_env() -> None:
+    """
+    Charge les variables d'environnement depuis .env.
+    Appelée seulement une fois les arguments validés, comme les imports de
+    l'application, pour que --help et les chemins invalides répondent vite.
+    """
+    from dotenv import load_dotenv
 
-import asyncio
-from src.core.extraction_orchestrator import ExtractionOrchestrator
-from src.api.openrouter_client import OpenRouterClient
-from src.utils.image_processor import ImageProcessor
-from src.utils.prompt_builder import PromptBuilder
-from src.core.response_parser import ResponseParser
-from src.core.error_handler import ErrorHandler
+    env_loaded = False
+    for candidate in ENV_PATH_CANDIDATES:
+        if candidate.is_file():
+            env_loaded = load_dotenv(dotenv_path=candidate, override=False)
+            if env_loaded:
+                break
+
+    if not env_loaded:
+        load_dotenv(override=False)
 
 
 async def async_main(image_path: str, args):
     """Coroutine principale pour l'extraction asynchrone."""
+    from src.core.extraction_orchestrator import ExtractionOrchestrator
+    from src.api.openrouter_client import OpenRouterClient
+    from src.utils.image_processor import ImageProcessor
+    from src.utils.prompt_builder import PromptBuilder
+    from src.core.response_parser import ResponseParser
+    from src.core.error_handler import ErrorHandler
+
     # Instanciation de toutes les dépendances
     api_client = OpenRouterClient()
     image_processor = ImageProcessor()
@@ -135,8 +141,13 @@ async def async_main(image_path: str, args):
                 print(f"   - Finish reason : None")
 
         # Affiche le JSON
-        json_indent = 2 if args.pretty else None
-        json_output = json.dumps(result["data"], indent=json_indent, ensure_ascii=False)
+        # Sans --pretty, la sérialisation de l'orchestrateur est réutilisée telle quelle
+        pretty_bytes = None
+        if args.pretty:
+            pretty_bytes = orjson.dumps(result["data"], option=orjson.OPT_INDENT_2)
+            json_output = pretty_bytes.decode("utf-8")
+        else:
+            json_output = result["data_json"].decode("utf-8")
 
         print("\n[DONNEES EXTRAITES]")
         print("=" * 80)
@@ -156,16 +167,19 @@ async def async_main(image_path: str, args):
             if data["totals"].get("total_matches") is False:
                 print("[ATTENTION] Le total ne correspond pas a la somme des articles")
 
-        # Sauvegarde si demandé
+        # Sauvegarde si demandé (toujours indentée)
         if args.output:
-            with open(args.output, "w", encoding="utf-8") as f:
-                json.dump(result["data"], f, indent=2, ensure_ascii=False)
+            if pretty_bytes is None:
+                pretty_bytes = orjson.dumps(result["data"], option=orjson.OPT_INDENT_2)
+            with open(args.output, "wb") as f:
+                f.write(pretty_bytes)
             print(f"\n[SAUVEGARDE] Resultat sauvegarde dans : {args.output}")
 
         return result
     finally:
         # Assurer la fermeture propre
         await orchestrator.close_client_session()
+        await OpenRouterClient.aclose_all()
 
 
 def main():
@@ -230,8 +244,12 @@ def main():
         print(f"[ERREUR] Fichier introuvable : {args.image_path}", file=sys.stderr)
         sys.exit(1)
 
+    # Imports lourds (openai, httpx, PIL...) différés après la validation des arguments
+    load_env()
+    from src.utils import event_loop
+
     # Exécute la coroutine principale
-    result = asyncio.run(async_main(args.image_path, args))
+    result = event_loop.run(async_main(args.image_path, args))
     
     # Si le résultat contient une erreur, on quitte avec un code d'erreur
     if result and not result.get("success", True):
@@ -1,5 +1,19 @@
 """Module utils pour traitement d'images et prompts."""
-from src.utils.image_processor import ImageProcessor
-from src.utils.prompt_builder import PromptBuilder
+from typing import TYPE_CHECKING
 
-__all__ = ["ImageProcessor", "PromptBuilder"]
+from src._lazy import lazy_exports
+
+if TYPE_CHECKING:
+    from src.utils.image_processor import ImageProcessor
+    from src.utils.prompt_builder import PromptBuilder
+    from src.utils.rate_limiter import TokenBucket
+    from src.utils.response_cache import TTLCache
+
+__all__ = ["ImageProcessor", "PromptBuilder", "TokenBucket", "TTLCache"]
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    "ImageProcessor": "src.utils.image_processor",
+    "PromptBuilder": "src.utils.prompt_builder",
+    "TokenBucket": "src.utils.rate_limiter",
+    "TTLCache": "src.utils.response_cache",
+})
@@ -0,0 +1,19 @@
+"""
+Lancement de la boucle d'événements, avec uvloop quand il est disponible.
+"""
+import asyncio
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+def run(main: Coroutine[Any, Any, T]) -> T:
+    """
+    Exécute la coroutine principale sur uvloop (Linux/macOS), sinon sur
+    la boucle asyncio standard (Windows, ou uvloop non installé).
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(main)
+    return uvloop.run(main)
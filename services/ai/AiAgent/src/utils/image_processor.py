@@ -2,14 +2,30 @@
 Traitement et préparation des images pour l'API.
 """
 import asyncio
+import atexit
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import ClassVar, FrozenSet, Optional, Tuple
 from PIL import Image
 import io
 
+try:
+    # Optionnel : libvips fusionne décodage et réduction (SIMD, sans décoder
+    # l'image pleine résolution), nettement plus rapide que Pillow
+    import pyvips
+except ImportError:
+    pyvips = None
+
 from src.config.app_config import settings
 from src.core.interfaces import ImageProcessorInterface
 
+# Pool dédié au traitement d'image : ne partage pas le pool par défaut de la
+# boucle avec les autres run_in_executor/to_thread (Pillow libère le GIL
+# pendant le décodage et le redimensionnement)
+_IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="img-proc")
+atexit.register(_IMAGE_EXECUTOR.shutdown, wait=False)
+
 
 class ImageProcessor(ImageProcessorInterface):
     """Processeur pour préparer les images avant envoi à l'API."""
@@ -30,7 +46,7 @@ class ImageProcessor(ImageProcessorInterface):
         if not normalized_extensions:
             normalized_extensions = {".jpg", ".jpeg", ".png", ".bmp"}
 
-        self._supported_extensions: set[str] = set(normalized_extensions)
+        self._supported_extensions: frozenset[str] = frozenset(normalized_extensions)
         self._supported_formats_display: Tuple[str, ...] = (
             tuple(raw_supported_formats)
             if raw_supported_formats
@@ -56,80 +72,176 @@ class ImageProcessor(ImageProcessorInterface):
         """
         return value.lower() if isinstance(value, str) else None
 
-    def validate_image(self, image_path: str) -> Tuple[bool, str]:
+    def _check_path(self, path: Path) -> Optional[str]:
         """
-        Valide qu'une image est compatible.
+        Vérifie l'existence et l'extension d'un fichier image (sans l'ouvrir).
+        Retourne le message d'erreur, ou None si le chemin est acceptable.
         """
-        path = Path(image_path)
-
         if not path.exists():
-            return False, f"Fichier introuvable : {image_path}"
+            return f"Fichier introuvable : {path}"
 
-        suffix = self._normalize_extension(path.suffix)
-        allowed_formats = ", ".join(self._supported_formats_display)
-        if not suffix or suffix not in self._supported_extensions:
+        # Path.suffix est vide ou commence déjà par '.' : seule la casse est à
+        # normaliser (un suffixe vide n'est jamais dans l'ensemble)
+        if path.suffix.lower() not in self._supported_extensions:
+            allowed_formats = ", ".join(self._supported_formats_display)
             human_suffix = path.suffix or "(sans extension)"
-            return False, f"Format non supporté : {human_suffix}. Formats acceptés : {allowed_formats}"
+            return f"Format non supporté : {human_suffix}. Formats acceptés : {allowed_formats}"
 
-        file_size = path.stat().st_size
+        return None
+
+    def _check_size(self, file_size: int) -> Optional[str]:
+        """Retourne le message d'erreur si l'image dépasse la taille maximale."""
         if file_size > self.max_file_size_bytes:
-            return False, f"Fichier trop volumineux : {file_size / (1024*1024):.2f}MB (max: {self.config.max_file_size_mb}MB)"
+            return f"Fichier trop volumineux : {file_size / (1024*1024):.2f}MB (max: {self.config.max_file_size_mb}MB)"
+        return None
+
+    def _check_format(self, img: Image.Image) -> Optional[str]:
+        """
+        Retourne le message d'erreur si Pillow a détecté un format non géré.
+        Vérification plus souple que l'extension, car Pillow peut lire des formats
+        même si l'extension est différente.
+        """
+        if self._safe_lower(img.format) not in self._SUPPORTED_PIL_FORMATS:
+            return f"Format d'image non géré : {img.format or 'inconnu'}"
+        return None
+
+    def validate_image(self, image_path: str) -> Tuple[bool, str]:
+        """
+        Valide qu'une image est compatible.
+        """
+        path = Path(image_path)
+        error = self._check_path(path) or self._check_size(path.stat().st_size)
+        if error:
+            return False, error
 
         try:
             with Image.open(image_path) as img:
-                # Vérification plus souple, car Pillow peut lire des formats même si l'extension est différente
-                image_format = self._safe_lower(img.format)
-                if image_format not in self._SUPPORTED_PIL_FORMATS:
-                    human_format = img.format or "inconnu"
-                    return False, f"Format d'image non géré : {human_format}"
+                error = self._check_format(img)
         except Exception as e:
             return False, f"Impossible d'ouvrir l'image : {str(e)}"
 
-        return True, "Image valide"
+        return (False, error) if error else (True, "Image valide")
+
+    def validate_image_bytes(self, image_bytes: bytes) -> Tuple[bool, str]:
+        """
+        Valide qu'une image reçue en mémoire est compatible.
+        """
+        error = self._check_size(len(image_bytes))
+        if error:
+            return False, error
+
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                error = self._check_format(img)
+        except Exception as e:
+            return False, f"Impossible d'ouvrir l'image : {str(e)}"
+
+        return (False, error) if error else (True, "Image valide")
+
+    def _encode_image(self, img: Image.Image, optimize: bool) -> Tuple[bytes, str]:
+        """
+        Redimensionne, convertit et encode une image PIL ouverte.
+
+        Returns:
+            Tuple[bytes, str]: L'image préparée sous forme de bytes et le type MIME.
+        """
+        # Redimensionnement si nécessaire
+        width, height = img.size
+        if width > self.config.max_width or height > self.config.max_height:
+            # JPEG au moins 2x plus grand que la cible : libjpeg décode directement
+            # à l'échelle 1/2, 1/4 ou 1/8 (DCT), sans jamais matérialiser la pleine
+            # résolution. La taille reste >= à la cible, LANCZOS fait l'ajustement final
+            if img.format == 'JPEG' and max(width, height) >= 2 * max(self.config.max_width, self.config.max_height):
+                img.draft('RGB', (self.config.max_width, self.config.max_height))
+                width, height = img.size
+            ratio = min(self.config.max_width / width, self.config.max_height / height)
+            new_width = int(width * ratio)
+            new_height = int(height * ratio)
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+        output_format = 'JPEG'
+        mime_type = 'image/jpeg'
+
+        # Conversion en RGB et optimisation
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.getchannel('A') if 'A' in img.getbands() else None)
+            img = background
+
+        # Sauvegarde dans un buffer mémoire
+        buffer = io.BytesIO()
+        if optimize:
+            img.save(buffer, output_format, quality=self.config.jpeg_quality, optimize=True)
+        else:
+            original_format = img.format or 'PNG'
+            output_format = 'PNG' if original_format.upper() == 'PNG' else 'JPEG'
+            mime_type = f'image/{output_format.lower()}'
+            img.save(buffer, format=output_format)
+
+        return buffer.getvalue(), mime_type
+
+    def _thumbnail_vips(self, image_bytes: bytes) -> Tuple[bytes, str]:
+        """
+        Réduit et encode l'image en JPEG avec libvips (chargement et
+        redimensionnement fusionnés), fond blanc si l'image a un canal alpha.
+
+        Returns:
+            Tuple[bytes, str]: L'image préparée sous forme de bytes et le type MIME.
+        """
+        options = {"height": self.config.max_height, "size": "down"}
+        img = pyvips.Image.thumbnail_buffer(image_bytes, self.config.max_width, **options)
+
+        if img.hasalpha():
+            img = img.flatten(background=[255, 255, 255])
+
+        buffer = img.jpegsave_buffer(Q=self.config.jpeg_quality, optimize_coding=True, strip=True)
+        return buffer, 'image/jpeg'
 
     def _process_image_sync(self, image_path: str, optimize: bool) -> Tuple[bytes, str]:
         """
         Prépare une image en mémoire (validation, redimensionnement, optimisation)
         et la retourne en tant qu'objet bytes et son type MIME.
+        Le fichier n'est lu qu'une fois : la suite se fait sur ses bytes.
+        Sa taille est vérifiée avant lecture, un fichier trop gros n'est pas chargé.
 
         Returns:
             Tuple[bytes, str]: L'image préparée sous forme de bytes et le type MIME.
         """
-        is_valid, message = self.validate_image(image_path)
-        if not is_valid:
-            raise ValueError(message)
-
-        with Image.open(image_path) as img:
-            # Redimensionnement si nécessaire
-            width, height = img.size
-            if width > self.config.max_width or height > self.config.max_height:
-                ratio = min(self.config.max_width / width, self.config.max_height / height)
-                new_width = int(width * ratio)
-                new_height = int(height * ratio)
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-            output_format = 'JPEG'
-            mime_type = 'image/jpeg'
-
-            # Conversion en RGB et optimisation
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.getchannel('A') if 'A' in img.getbands() else None)
-                img = background
-
-            # Sauvegarde dans un buffer mémoire
-            buffer = io.BytesIO()
-            if optimize:
-                img.save(buffer, output_format, quality=self.config.jpeg_quality, optimize=True)
-            else:
-                original_format = img.format or 'PNG'
-                output_format = 'PNG' if original_format.upper() == 'PNG' else 'JPEG'
-                mime_type = f'image/{output_format.lower()}'
-                img.save(buffer, format=output_format)
-            
-            return buffer.getvalue(), mime_type
+        path = Path(image_path)
+        error = self._check_path(path) or self._check_size(path.stat().st_size)
+        if error:
+            raise ValueError(error)
+
+        return self._process_image_bytes_sync(path.read_bytes(), optimize)
+
+    def _process_image_bytes_sync(self, image_bytes: bytes, optimize: bool) -> Tuple[bytes, str]:
+        """
+        Prépare une image déjà chargée en mémoire, sans passer par le disque.
+        L'image n'est ouverte qu'une fois pour la validation et le traitement.
+
+        Returns:
+            Tuple[bytes, str]: L'image préparée sous forme de bytes et le type MIME.
+        """
+        error = self._check_size(len(image_bytes))
+        if error:
+            raise ValueError(error)
+
+        try:
+            img = Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            raise ValueError(f"Impossible d'ouvrir l'image : {str(e)}")
+
+        with img:
+            error = self._check_format(img)
+            if error:
+                raise ValueError(error)
+
+            if optimize and pyvips is not None:
+                return self._thumbnail_vips(image_bytes)
+
+            return self._encode_image(img, optimize)
 
     async def process_image_in_memory(self, image_path: str, optimize: bool = True) -> Tuple[bytes, str]:
         """
@@ -140,4 +252,14 @@ class ImageProcessor(ImageProcessorInterface):
             Tuple[bytes, str]: L'image préparée sous forme de bytes et le type MIME.
         """
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, self._process_image_sync, image_path, optimize)
\ No newline at end of file
+        return await loop.run_in_executor(_IMAGE_EXECUTOR, self._process_image_sync, image_path, optimize)
+
+    async def process_image_bytes_in_memory(self, image_bytes: bytes, optimize: bool = True) -> Tuple[bytes, str]:
+        """
+        Prépare une image fournie sous forme de bytes (upload, base64 décodé).
+
+        Returns:
+            Tuple[bytes, str]: L'image préparée sous forme de bytes et le type MIME.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_IMAGE_EXECUTOR, self._process_image_bytes_sync, image_bytes, optimize)
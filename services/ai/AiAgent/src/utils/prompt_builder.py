@@ -1,38 +1,35 @@
 """
 Construction de prompts structurés pour l'extraction de tickets.
 """
+import functools
 from typing import Optional
 from src.config.categories import get_categories_as_string
 from src.core.interfaces import PromptBuilderInterface
 
 
-class PromptBuilder(PromptBuilderInterface):
-    """Constructeur de prompts pour l'analyse de tickets avec Llama Scout."""
+@functools.lru_cache(maxsize=None)
+def _build_extraction_prompt(include_validation: bool) -> str:
+    """
+    Construit le prompt d'extraction. Ne dépend que de `include_validation` :
+    mémoïsé pour n'être assemblé qu'une fois par processus.
+    """
+    categories = get_categories_as_string()
 
-    def build_prompt(self, include_validation: bool = True) -> str:
-        return self.build_extraction_prompt(include_validation)
-
-    def build_extraction_prompt(self, include_validation: bool = True) -> str:
-        """
-        Build the complete extraction prompt in English for WeSplit integration.
-        """
-        categories = get_categories_as_string()
-
-        prompt = f"""You are an expert in receipt and bill data extraction.
+    prompt = f"""You are an expert in receipt and bill data extraction.
 Your mission is to analyze the provided image and extract all information in raw JSON format.
 Return ONLY the JSON, without Markdown tags, without formatting, and without any text before or after.
 
 """
 
-        if include_validation:
-            prompt += """**STEP 1 - VALIDATION**
+    if include_validation:
+        prompt += """**STEP 1 - VALIDATION**
 First verify that the image contains a receipt or bill with expense information.
 If it is NOT a receipt/bill, return only:
 {{"is_receipt": false, "reason": "brief explanation"}}
 
 """
 
-        prompt += f"""**DATA EXTRACTION**
+    prompt += f"""**DATA EXTRACTION**
 If it is indeed a receipt/bill, extract the following information in raw JSON:
 
 **Expected format:**
@@ -89,7 +86,29 @@ Choose ONE category from:
 - Verify that the sum of items matches the total
 - Negative amounts (discounts/refunds) should be converted to positive values"""
 
-        return prompt
+    return prompt
+
+
+class PromptBuilder(PromptBuilderInterface):
+    """Constructeur de prompts pour l'analyse de tickets avec Llama Scout."""
+
+    def build_prompt(self, include_validation: bool = True) -> str:
+        return self.build_extraction_prompt(include_validation)
+
+    def build_extraction_prompt(self, include_validation: bool = True) -> str:
+        """
+        Build the complete extraction prompt in English for WeSplit integration.
+        """
+        return _build_extraction_prompt(include_validation)
+
+    def build_system_prompt(self, include_validation: bool = True) -> str:
+        """
+        Build the system message used when prompt caching is enabled.
+        The extraction prompt has no per-call part, so this is the whole
+        prompt: it is sent as the cached system message and the user message
+        only carries the image.
+        """
+        return _build_extraction_prompt(include_validation)
 
     def build_validation_only_prompt(self) -> str:
         """
@@ -103,4 +122,4 @@ If it's a receipt or bill with an expense:
 Otherwise:
 {"is_receipt": false, "reason": "brief explanation"}
 
-Return ONLY the JSON, without Markdown tags, without formatting, and without any text before or after."""
\ No newline at end of file
+Return ONLY the JSON, without Markdown tags, without formatting, and without any text before or after."""
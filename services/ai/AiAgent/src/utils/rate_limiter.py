@@ -0,0 +1,77 @@
+"""
+Limiteur de débit proactif (token bucket) pour les appels à OpenRouter.
+"""
+import asyncio
+import time
+from typing import Optional
+
+# Coût approximatif d'une image en tokens d'entrée pour les modèles vision
+IMAGE_TOKEN_ESTIMATE = 1500
+
+
+def estimate_tokens(prompt: str, max_tokens: int, image_count: int = 1) -> int:
+    """
+    Estime le nombre de tokens consommés par un appel (entrée + sortie maximale).
+    """
+    return len(prompt) // 4 + image_count * IMAGE_TOKEN_ESTIMATE + max_tokens
+
+
+class TokenBucket:
+    """
+    Double seau à jetons : requêtes par minute et tokens par minute.
+
+    Plutôt que d'envoyer la requête puis d'attendre un 429, `acquire` dort
+    exactement le temps nécessaire pour que les deux seaux aient assez de
+    capacité. Une limite à None est ignorée.
+    """
+
+    def __init__(self, rate_rpm: Optional[int] = None, rate_tpm: Optional[int] = None):
+        self.rate_rpm = rate_rpm
+        self.rate_tpm = rate_tpm
+        self._requests = float(rate_rpm or 0)
+        self._tokens = float(rate_tpm or 0)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Recharge les seaux proportionnellement au temps écoulé."""
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.rate_rpm:
+            self._requests = min(float(self.rate_rpm), self._requests + elapsed * self.rate_rpm / 60.0)
+        if self.rate_tpm:
+            self._tokens = min(float(self.rate_tpm), self._tokens + elapsed * self.rate_tpm / 60.0)
+
+    def _wait_time(self, tokens: int) -> float:
+        """Calcule le délai (s) avant que la requête puisse partir."""
+        wait = 0.0
+        if self.rate_rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rate_rpm)
+        if self.rate_tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60.0 / self.rate_tpm)
+        return wait
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """
+        Attend que la requête respecte les limites puis consomme sa capacité.
+        """
+        if not self.rate_rpm and not self.rate_tpm:
+            return
+
+        if self.rate_tpm:
+            # Une requête plus grosse que le seau ne doit pas bloquer indéfiniment
+            tokens = min(tokens, self.rate_tpm)
+
+        # Le verrou garantit l'ordre FIFO : les suivants attendent derrière
+        async with self._lock:
+            self._refill()
+            wait = self._wait_time(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                self._refill()
+
+            if self.rate_rpm:
+                self._requests -= 1
+            if self.rate_tpm:
+                self._tokens -= tokens
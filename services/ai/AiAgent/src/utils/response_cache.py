@@ -0,0 +1,44 @@
+"""
+Cache mémoire LRU avec expiration pour les résultats d'extraction.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, MutableMapping, Optional, Tuple
+
+
+class TTLCache(MutableMapping[str, Any]):
+    """
+    Mapping LRU borné dont les entrées expirent après `ttl` secondes.
+
+    Implémente MutableMapping pour pouvoir être remplacé par n'importe quel
+    autre stockage (Redis, etc.) injecté dans l'orchestrateur.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def __getitem__(self, key: str) -> Any:
+        expires_at, value = self._data[key]
+        if expires_at < time.monotonic():
+            del self._data[key]
+            raise KeyError(key)
+        self._data.move_to_end(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __delitem__(self, key: str) -> None:
+        del self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
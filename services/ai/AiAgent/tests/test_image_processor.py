@@ -0,0 +1,57 @@
+"""
+Tests du traitement d'image (validation et préparation en mémoire).
+"""
+import io
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+# Ajoute le répertoire racine au PYTHONPATH pour les imports absolus
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils import image_processor
+from src.utils.image_processor import ImageProcessor
+
+
+def test_image_file_is_opened_once(tmp_path):
+    """Un fichier image n'est ouvert qu'une fois pour la validation et le traitement."""
+    image_path = tmp_path / "ticket.jpg"
+    Image.new("RGB", (64, 48), (255, 255, 255)).save(image_path)
+
+    with patch.object(image_processor.Image, "open", wraps=Image.open) as mock_open:
+        image_bytes, mime_type = ImageProcessor()._process_image_sync(str(image_path), optimize=True)
+
+    assert mock_open.call_count == 1
+    assert mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(image_bytes)).size == (64, 48)
+
+
+def test_oversized_file_is_rejected_before_reading(tmp_path):
+    """Un fichier plus gros que la limite est refusé sans que son contenu soit lu."""
+    image_path = tmp_path / "ticket.jpg"
+    image_path.write_bytes(b"\0" * 2048)
+
+    processor = ImageProcessor()
+    processor.max_file_size_bytes = 1024
+    with patch.object(Path, "read_bytes") as mock_read, pytest.raises(ValueError, match="trop volumineux"):
+        processor._process_image_sync(str(image_path), optimize=True)
+
+    mock_read.assert_not_called()
+
+
+def test_large_jpeg_is_draft_decoded_to_target_size():
+    """Un JPEG bien plus grand que la cible est décodé à échelle réduite puis ajusté exactement."""
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").resize((8000, 6000)).convert("RGB").save(buffer, "JPEG", quality=80)
+
+    processor = ImageProcessor()
+    with patch.object(image_processor, "pyvips", None), \
+            patch.object(Image.Image, "resize", autospec=True, side_effect=Image.Image.resize) as mock_resize:
+        image_bytes, _ = processor._process_image_bytes_sync(buffer.getvalue(), optimize=True)
+
+    # LANCZOS ne part plus de 8000x6000 mais de l'image décodée à 1/2
+    assert mock_resize.call_args.args[0].size == (4000, 3000)
+    assert Image.open(io.BytesIO(image_bytes)).size == (2048, 1536)
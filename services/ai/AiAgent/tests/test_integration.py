@@ -18,6 +18,35 @@ from src.core.error_handler import ErrorHandler
 from src.core.json_formatter import ReceiptData
 
 
+def make_orchestrator(api_response=None, image_bytes=b"mock_image_bytes", **overrides):
+    """
+    Orchestrateur branché sur des mocks du client API, du traitement d'image
+    et des prompts ; parseur et gestionnaire d'erreurs réels sauf surcharge.
+    Les mocks restent accessibles via extractor.client, extractor.image_processor...
+    """
+    mock_api_client = Mock(spec=OpenRouterClient)
+    if api_response is not None:
+        mock_api_client.analyze_receipt.return_value = api_response
+
+    mock_image_processor = Mock(spec=ImageProcessor)
+    mock_image_processor.process_image_in_memory.return_value = (image_bytes, "image/jpeg")
+
+    # Les prompts sont construits à l'initialisation de l'orchestrateur
+    mock_prompt_builder = Mock(spec=PromptBuilder)
+    mock_prompt_builder.build_extraction_prompt.return_value = "Mock prompt"
+    mock_prompt_builder.build_validation_only_prompt.return_value = "Validation prompt"
+
+    dependencies = {
+        "api_client": mock_api_client,
+        "image_processor": mock_image_processor,
+        "prompt_builder": mock_prompt_builder,
+        "response_parser": ResponseParser(),
+        "error_handler": ErrorHandler(),
+    }
+    dependencies.update(overrides)
+    return ExtractionOrchestrator(**dependencies)
+
+
 def test_integration():
     """Test d'intégration du pipeline d'extraction."""
     # Crée des mocks pour les dépendances externes
@@ -87,5 +116,158 @@ def test_integration():
         print("Test d'intégration passé avec succès !")
 
 
+def test_integration_from_bytes():
+    """Test de l'extraction depuis des bytes en mémoire, sans fichier temporaire."""
+    extractor = make_orchestrator({
+        "success": True,
+        "content": '{"is_receipt": true, "items": []}',
+        "usage": {"total_tokens": 100},
+        "metrics": {"generation_time_ms": 500}
+    })
+    mock_api_client = extractor.client
+    mock_image_processor = extractor.image_processor
+    mock_image_processor.process_image_bytes_in_memory.return_value = (b"optimized_bytes", "image/jpeg")
+
+    import asyncio
+    result = asyncio.run(extractor.extract_from_bytes(b"raw_upload_bytes", "image/jpeg"))
+
+    assert result["success"], f"L'extraction a échoué : {result.get('error', 'Erreur inconnue')}"
+    assert result["is_receipt"] is True
+    mock_image_processor.process_image_in_memory.assert_not_called()
+    mock_image_processor.process_image_bytes_in_memory.assert_called_once_with(b"raw_upload_bytes", optimize=True)
+    assert mock_api_client.analyze_receipt.call_args.kwargs["image_bytes"] == b"optimized_bytes"
+
+
+def test_identical_image_served_from_cache():
+    """Une image déjà analysée ne déclenche pas un second appel API."""
+    extractor = make_orchestrator({
+        "success": True,
+        "content": '{"is_receipt": true, "items": []}',
+        "usage": {"total_tokens": 100},
+        "metrics": {"generation_time_ms": 500}
+    })
+    mock_api_client = extractor.client
+
+    import asyncio
+    first = asyncio.run(extractor.extract(image_path="Dataset/FR1.jpg"))
+    second = asyncio.run(extractor.extract(image_path="Dataset/FR1.jpg"))
+
+    assert first["success"] and second["success"]
+    assert second["data"] == first["data"]
+    assert mock_api_client.analyze_receipt.call_count == 1
+    assert second["cached"] is True and second["usage"] == {}
+
+    # Modifier un résultat servi ne doit pas altérer l'entrée en cache
+    second["data"]["items"].append({"name": "ajout"})
+    third = asyncio.run(extractor.extract(image_path="Dataset/FR1.jpg"))
+    assert third["data"] == first["data"]
+
+    assert extractor.clear_cache() == 1
+    asyncio.run(extractor.extract(image_path="Dataset/FR1.jpg"))
+    assert mock_api_client.analyze_receipt.call_count == 2
+
+
+def test_speculative_two_step_cancels_extraction_for_non_receipt():
+    """En two-step spéculatif, l'extraction lancée en parallèle est annulée pour un non-ticket."""
+    import asyncio
+    extraction_cancelled = asyncio.Event()
+
+    async def analyze_receipt(image_bytes, mime_type, prompt, max_tokens):
+        if prompt == "Validation prompt":
+            await asyncio.sleep(0.01)
+            return {"success": True, "content": '{"is_receipt": false, "reason": "paysage"}'}
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            extraction_cancelled.set()
+            raise
+
+    extractor = make_orchestrator(image_bytes=b"landscape_bytes")
+    mock_api_client = extractor.client
+    mock_api_client.analyze_receipt.side_effect = analyze_receipt
+    extractor.config = extractor.config.model_copy(update={"speculative_two_step": True})
+
+    async def run():
+        result = await extractor.extract(image_path="Dataset/landscape.jpg", two_step=True)
+        await asyncio.sleep(0)
+        return result
+
+    result = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert result["success"] and result["is_receipt"] is False
+    assert mock_api_client.analyze_receipt.call_count == 2
+    assert extraction_cancelled.is_set()
+
+
+def test_streamed_one_shot_stops_at_closing_brace():
+    """En streaming, le JSON est parsé dès que l'objet se ferme et le flux est fermé."""
+    import asyncio
+    stream_closed = asyncio.Event()
+
+    async def analyze_receipt_stream(image_bytes, mime_type, prompt, max_tokens, summary):
+        try:
+            for chunk in ('{"is_receipt": false, ', '"reason": "paysage"}', "\n\n"):
+                yield chunk
+            raise AssertionError("Le flux aurait dû être fermé après l'objet JSON")
+        finally:
+            stream_closed.set()
+
+    extractor = make_orchestrator(image_bytes=b"streamed_bytes")
+    mock_api_client = extractor.client
+    mock_api_client.analyze_receipt_stream.side_effect = analyze_receipt_stream
+    extractor.config = extractor.config.model_copy(update={"stream_responses": True})
+
+    result = asyncio.run(extractor.extract(image_path="Dataset/landscape.jpg"))
+
+    assert result["success"] and result["is_receipt"] is False
+    assert result["data"]["reason"] == "paysage"
+    assert stream_closed.is_set()
+    mock_api_client.analyze_receipt.assert_not_called()
+
+
+def test_extract_batch_bounds_concurrency():
+    """extract_batch garde l'ordre des résultats et ne dépasse pas la concurrence demandée."""
+    import asyncio
+    in_flight = 0
+    max_in_flight = 0
+
+    async def analyze_receipt(image_bytes, mime_type, prompt, max_tokens):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {"success": True, "content": '{"is_receipt": true, "items": []}'}
+
+    async def process_image_in_memory(image_path, optimize=True):
+        return image_path.encode(), "image/jpeg"
+
+    extractor = make_orchestrator()
+    extractor.client.analyze_receipt.side_effect = analyze_receipt
+    extractor.image_processor.process_image_in_memory.side_effect = process_image_in_memory
+
+    paths = [f"Dataset/ticket-{i}.jpg" for i in range(6)]
+    results = asyncio.run(extractor.extract_batch(paths, concurrency=2))
+
+    assert len(results) == len(paths)
+    assert all(result["success"] for result in results)
+    assert max_in_flight == 2
+
+
+def test_serialize_json_returns_only_bytes():
+    """En mode serialize="json", seules les données sérialisées sont renvoyées."""
+    extractor = make_orchestrator(
+        {"success": True, "content": '{"is_receipt": false, "reason": "paysage"}'},
+        image_bytes=b"json_mode_bytes",
+        serialize="json"
+    )
+
+    import asyncio
+    result = asyncio.run(extractor.extract(image_path="Dataset/landscape.jpg"))
+
+    assert result["success"] and "data" not in result
+    assert json.loads(result["data_json"]) == {"is_receipt": False, "reason": "paysage"}
+
+
 if __name__ == "__main__":
     test_integration()
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Tests du client OpenRouter (sans appel réseau).
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# Ajoute le répertoire racine au PYTHONPATH pour les imports absolus
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.api.openrouter_client import OpenRouterClient
+
+
+def test_clients_share_one_http_session():
+    """Les clients d'une même clé réutilisent le même pool de connexions, fermé par aclose_all."""
+    first = OpenRouterClient(api_key="test-key")
+    second = OpenRouterClient(api_key="test-key")
+
+    assert first.http_client is second.http_client
+
+    # close() laisse le client partagé ouvert pour les autres instances
+    asyncio.run(first.close())
+    assert not second.http_client.is_closed
+
+    asyncio.run(OpenRouterClient.aclose_all())
+    assert second.http_client.is_closed
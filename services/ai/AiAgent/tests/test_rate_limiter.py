@@ -0,0 +1,34 @@
+"""
+Tests du limiteur de débit proactif (token bucket).
+"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Ajoute le répertoire racine au PYTHONPATH pour les imports absolus
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils.rate_limiter import TokenBucket
+
+
+def test_token_bucket_waits_for_request_refill():
+    """La deuxième requête attend la recharge du seau (600 rpm -> 0,1 s)."""
+    async def run():
+        bucket = TokenBucket(rate_rpm=600)
+        bucket._requests = 1.0
+        start = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert elapsed >= 0.09, f"Le limiteur n'a pas attendu : {elapsed:.3f}s"
+
+
+def test_token_bucket_without_limits_is_noop():
+    """Sans limite configurée, acquire retourne immédiatement."""
+    bucket = TokenBucket()
+    start = time.monotonic()
+    asyncio.run(bucket.acquire(10_000))
+    assert time.monotonic() - start < 0.05
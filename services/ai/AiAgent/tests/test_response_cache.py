@@ -0,0 +1,31 @@
+"""
+Tests du cache mémoire LRU avec expiration.
+"""
+import sys
+import time
+from pathlib import Path
+
+# Ajoute le répertoire racine au PYTHONPATH pour les imports absolus
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.utils.response_cache import TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Au-delà de maxsize, l'entrée la moins récemment lue est évincée."""
+    cache = TTLCache(maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache["a"] == 1
+    cache["c"] = 3
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    """Une entrée expirée n'est plus servie."""
+    cache = TTLCache(maxsize=4, ttl=0.01)
+    cache["a"] = 1
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
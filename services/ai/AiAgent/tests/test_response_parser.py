@@ -0,0 +1,61 @@
+"""
+Tests de l'extraction du JSON dans les réponses de l'API.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ajoute le répertoire racine au PYTHONPATH pour les imports absolus
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.response_parser import ResponseParser, _find_json_bounds
+
+
+def test_extracts_fenced_json_block():
+    """Un bloc ```json est extrait tel quel."""
+    text = 'Voici le résultat :\n```json\n{"is_receipt": true}\n```\nFin.'
+    assert ResponseParser().extract_json_from_response(text) == '{"is_receipt": true}'
+
+
+def test_extracts_json_surrounded_by_prose():
+    """Le JSON entouré de texte est délimité par raw_decode, accolades dans les chaînes comprises."""
+    text = 'Résultat : {"notes": "prix {approx}", "items": [1, 2]} merci !'
+    parser = ResponseParser()
+    assert parser.extract_json_from_response(text) == '{"notes": "prix {approx}", "items": [1, 2]}'
+    assert parser.extract_json_obj(text) == {"notes": "prix {approx}", "items": [1, 2]}
+
+
+def test_raises_without_json():
+    """Une réponse sans JSON valide lève ValueError."""
+    with pytest.raises(ValueError):
+        ResponseParser().extract_json_from_response("Aucun ticket détecté.")
+
+
+def test_clean_json_returned_stripped():
+    """Une réponse déjà en JSON brut est renvoyée sans les espaces autour."""
+    assert ResponseParser().extract_json_from_response('  {"total": 10.5}\n') == '{"total": 10.5}'
+
+
+def test_find_json_bounds_skips_strings_and_escapes():
+    """La machine à états ignore les accolades dans les chaînes et les guillemets échappés."""
+    text = 'note "avec { accolade" puis {"a": "x}\\"y", "b": [1, {"c": 2}]} fin'
+    start, end = _find_json_bounds(text)
+    assert text[start:end] == '{"a": "x}\\"y", "b": [1, {"c": 2}]}'
+    assert _find_json_bounds('{"a": "non terminée') == (-1, -1)
+
+
+def test_stream_scanner_resumes_across_chunks():
+    """Le scanner garde son état entre les morceaux : chaînes, échappements et accolades coupés."""
+    chunks = ['Voici : {"a": "x}', '\\', '"y", "b": {"c": "\\\\', '"}', ', "d": 1', '}\n```']
+    scanner = ResponseParser().json_stream_scanner()
+    results = [scanner.feed(chunk) for chunk in chunks]
+
+    assert results[:-1] == [None] * (len(chunks) - 1)
+    assert results[-1] == '{"a": "x}\\"y", "b": {"c": "\\\\"}, "d": 1}'
+    assert scanner.text == "".join(chunks)
+
+    # Un tableau de premier niveau est repéré de la même façon
+    array_scanner = ResponseParser().json_stream_scanner()
+    assert array_scanner.feed('[{"a": "]"}, ') is None
+    assert array_scanner.feed('[1]] fin') == '[{"a": "]"}, [1]]'